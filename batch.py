@@ -0,0 +1,310 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+import program
+
+GRAPH_SUFFIXES = ('.csv', '.bin')
+
+
+class BatchResult:
+    key: object
+    result: program.Result
+    seconds: float
+
+    def __init__(self, key, result: program.Result, seconds: float):
+        self.key = key
+        self.result = result
+        self.seconds = seconds
+
+
+class SharedGraph:
+    # Vertex colors and edge endpoints of one interned graph in a shared
+    # memory block, so workers map them instead of unpickling a copy. The
+    # worker writes the new colors back over the old ones.
+    memory: SharedMemory
+    vertex_count: int
+    edge_count: int
+
+    def __init__(self, node_colors, first: np.ndarray, second: np.ndarray):
+        self.vertex_count = len(node_colors)
+        self.edge_count = len(first)
+        self.memory = SharedMemory(create=True, size=max(1, shared_size(
+            self.vertex_count, self.edge_count)))
+        colors, shared_first, shared_second = self.arrays()
+        colors[:] = np.frombuffer(node_colors, dtype=np.int8)
+        shared_first[:] = first
+        shared_second[:] = second
+
+    def spec(self) -> tuple:
+        return self.memory.name, self.vertex_count, self.edge_count
+
+    def arrays(self):
+        return shared_arrays(self.memory, self.vertex_count, self.edge_count)
+
+    def release(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+def shared_size(vertex_count: int, edge_count: int) -> int:
+    return vertex_count + -vertex_count % 8 + 8 * edge_count
+
+
+def shared_arrays(memory: SharedMemory, vertex_count: int, edge_count: int):
+    position = vertex_count + -vertex_count % 8
+    colors = np.ndarray(vertex_count, np.int8, memory.buf, 0)
+    first = np.ndarray(edge_count, np.int32, memory.buf, position)
+    second = np.ndarray(edge_count, np.int32, memory.buf,
+                        position + 4 * edge_count)
+    return colors, first, second
+
+
+def solve_shared(spec: tuple, solver: str):
+    start = time.perf_counter()
+    name, vertex_count, edge_count = spec
+    # Pool workers share the resource tracker of the parent, which owns
+    # and unlinks the block.
+    memory = SharedMemory(name=name)
+    try:
+        conflict = solve_arrays(
+            *shared_arrays(memory, vertex_count, edge_count), solver)
+    finally:
+        memory.close()
+    return conflict, time.perf_counter() - start
+
+
+def solve_arrays(colors: np.ndarray, first: np.ndarray, second: np.ndarray,
+                 solver: str):
+    sources, targets = program.link_statements_vectorized(first, second,
+                                                          colors)
+    graph = program.ImplicationGraph.from_edges(2 * len(colors), sources,
+                                                targets)
+    try:
+        new_colors = program.select_colors(
+            program.find_components(graph, solver),
+            program.to_array('b', colors))
+    except program.UnsatisfiableError as error:
+        return error.vertex
+    colors[:] = np.frombuffer(new_colors, dtype=np.int8)
+    return None
+
+
+def solve_file(path: str, solver: str):
+    start = time.perf_counter()
+    result = program.solve_graph(*program.load_graph(path), solver)
+    return result, time.perf_counter() - start
+
+
+def solve_files(paths, solver: str = "tarjan", workers: int = None):
+    # Yields a BatchResult keyed by path for every file as soon as it is
+    # solved; each worker reads its own file.
+    with ProcessPoolExecutor(workers) as pool:
+        pending = {pool.submit(solve_file, path, solver): path
+                   for path in paths}
+        while pending:
+            done = wait(pending, return_when=FIRST_COMPLETED)[0]
+            for future in done:
+                result, seconds = future.result()
+                yield BatchResult(pending.pop(future), result, seconds)
+
+
+def solve_graphs(graphs, solver: str = "tarjan", workers: int = None):
+    # graphs is a dict or a sequence of (edges, colors) pairs as accepted by
+    # program.solve. Graphs are interned here, passed to the workers through
+    # shared memory, and at most two per worker are in flight at a time.
+    items = graphs.items() if isinstance(graphs, dict) else enumerate(graphs)
+    limit = 2 * (workers or os.cpu_count() or 1)
+    pending = {}
+    with ProcessPoolExecutor(workers) as pool:
+        try:
+            for key, (edges, colors) in items:
+                builder = program.StreamingGraphBuilder()
+                first, second = builder.intern_columns(
+                    *program.pairs_to_columns(edges, colors))
+                shared = SharedGraph(builder.node_colors, first, second)
+                future = pool.submit(solve_shared, shared.spec(), solver)
+                pending[future] = key, builder.node_names(), shared
+                if len(pending) >= limit:
+                    yield from collect_shared(pending)
+            while pending:
+                yield from collect_shared(pending)
+        finally:
+            for future, (key, node_names, shared) in pending.items():
+                future.cancel()
+                shared.release()
+
+
+def collect_shared(pending: dict):
+    done = wait(pending, return_when=FIRST_COMPLETED)[0]
+    for future in done:
+        key, node_names, shared = pending.pop(future)
+        try:
+            conflict, seconds = future.result()
+            names = program.restore_names(node_names)
+            if conflict is None:
+                colors = shared.arrays()[0].tolist()
+                result = program.Result({
+                    name: program.COLORS[color]
+                    for name, color in zip(names, colors)})
+            else:
+                result = program.Result(conflict=names[conflict])
+        finally:
+            shared.release()
+        yield BatchResult(key, result, seconds)
+
+
+def solve_by_components(edges, colors, solver: str = "tarjan",
+                        workers: int = None) -> program.Result:
+    builder = program.StreamingGraphBuilder()
+    first, second = builder.intern_columns(
+        *program.pairs_to_columns(edges, colors))
+    names = program.restore_names(builder.node_names())
+    try:
+        new_colors = solve_components(
+            np.frombuffer(builder.node_colors, np.int8), first, second,
+            solver, workers)
+    except program.UnsatisfiableError as error:
+        return program.Result(conflict=names[error.vertex])
+    return program.Result({name: program.COLORS[color]
+                           for name, color in zip(names, new_colors)})
+
+
+def solve_components(node_colors: np.ndarray, first: np.ndarray,
+                     second: np.ndarray, solver: str = "tarjan",
+                     workers: int = None, min_task_edges: int = 10_000):
+    # Different connected components of the input graph share no
+    # implication edges, so each one is an independent 2-SAT instance.
+    # Vertices and edges are sorted by component into one shared block,
+    # consecutive components are grouped into tasks of similar size, and
+    # the first conflict stops the tasks that have not started yet.
+    vertex_count = len(node_colors)
+    labels = program.connected_components(first, second, vertex_count)
+    vertex_order = np.argsort(labels, kind='stable')
+    position = np.empty(vertex_count, dtype=np.int32)
+    position[vertex_order] = np.arange(vertex_count, dtype=np.int32)
+
+    component_start = np.diff(labels[vertex_order], prepend=-1) != 0
+    component_of = np.cumsum(component_start) - 1
+    component_count = int(component_start.sum())
+    edge_component = component_of[position[first]]
+    edge_order = np.argsort(edge_component, kind='stable')
+    vertex_bounds = np.append(np.flatnonzero(component_start), vertex_count)
+    edge_bounds = np.zeros(component_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_component, minlength=component_count),
+              out=edge_bounds[1:])
+
+    workers = workers or os.cpu_count() or 1
+    target = max(min_task_edges, len(first) // (4 * workers))
+    component_edges = np.diff(edge_bounds)
+    task_index = (np.cumsum(component_edges) - component_edges) // target
+    task_bounds = np.append(
+        np.flatnonzero(np.diff(task_index, prepend=-1) != 0),
+        component_count)
+
+    shared = SharedGraph(node_colors[vertex_order],
+                         position[first][edge_order],
+                         position[second][edge_order])
+    stop = SharedMemory(create=True, size=1)
+    stop.buf[0] = 0
+    pool = ProcessPoolExecutor(workers)
+    conflict = None
+    try:
+        pending = set()
+        for start, end in zip(task_bounds[:-1].tolist(),
+                              task_bounds[1:].tolist()):
+            pending.add(pool.submit(
+                solve_shared_range, shared.spec(), stop.name,
+                (int(vertex_bounds[start]), int(vertex_bounds[end])),
+                (int(edge_bounds[start]), int(edge_bounds[end])), solver))
+        while pending and conflict is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                conflict = future.result()
+                if conflict is not None:
+                    stop.buf[0] = 1
+                    raise program.UnsatisfiableError(
+                        int(vertex_order[conflict]))
+
+        new_colors = np.empty(vertex_count, dtype=np.int8)
+        new_colors[vertex_order] = shared.arrays()[0]
+        return program.to_array('b', new_colors)
+    finally:
+        pool.shutdown(wait=conflict is None, cancel_futures=True)
+        shared.release()
+        stop.close()
+        stop.unlink()
+
+
+def solve_shared_range(spec: tuple, stop_name: str, vertex_range: tuple,
+                       edge_range: tuple, solver: str):
+    try:
+        stop = SharedMemory(name=stop_name)
+        memory = SharedMemory(name=spec[0])
+    except FileNotFoundError:
+        # The whole solve was already stopped and cleaned up.
+        return None
+    try:
+        if stop.buf[0]:
+            return None
+        colors, first, second = shared_arrays(memory, *spec[1:])
+        low, high = vertex_range
+        edge_slice = slice(*edge_range)
+        conflict = solve_arrays(colors[low:high], first[edge_slice] - low,
+                                second[edge_slice] - low, solver)
+        del colors, first, second
+    finally:
+        memory.close()
+        stop.close()
+    return None if conflict is None else low + conflict
+
+
+def list_graph_files(source: str) -> list:
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name)
+                      for name in os.listdir(source)
+                      if name.endswith(GRAPH_SUFFIXES))
+    # A manifest: one graph path per line, relative to the manifest.
+    base = os.path.dirname(source)
+    with open(source, 'r', encoding='utf-8') as manifest:
+        return [os.path.join(base, line.strip()) for line in manifest
+                if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Solve many graph files on all cores")
+    parser.add_argument('source',
+                        help="directory of graph files or a manifest file")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--solver', choices=program.SOLVERS, default="tarjan")
+    parser.add_argument('--components', action='store_true',
+                        help="source is a single graph: solve its connected "
+                             "components in parallel into output_file.txt")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.components:
+        node_names, node_colors, first, second = \
+            program.load_endpoints(args.source)
+        try:
+            new_colors = solve_components(node_colors, first, second,
+                                          args.solver, args.workers)
+        except program.UnsatisfiableError:
+            print("Iit is impossible to color this graph")
+            sys.exit()
+        program.write_to_file(node_names, new_colors)
+        print(f'Total: {time.perf_counter() - start:.3f} s')
+        sys.exit()
+
+    for item in solve_files(list_graph_files(args.source), args.solver,
+                            args.workers):
+        verdict = "solved" if item.result.satisfiable else \
+            f"impossible (vertex {item.result.conflict})"
+        print(f'{item.key}: {verdict} in {item.seconds * 1000:.1f} ms')
+    print(f'Total: {time.perf_counter() - start:.3f} s')
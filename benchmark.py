@@ -0,0 +1,809 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+
+import numpy as np
+import pandas as pd
+
+import checker
+import create_graph_csv
+import incremental
+import instrumentation
+import parallel_scc
+import program
+import result_cache
+
+
+def fill_out_times_rescan(graph: program.ImplicationGraph) -> array:
+    # First pass as it was before per-frame edge cursors: the out edges of
+    # the node on top of the stack are rescanned from the start every time.
+    offsets = graph.offsets
+    targets = graph.targets
+    tout = array('i', [program.NOT_VISITED]) * graph.literal_count
+    time_ = 0
+    for node in range(graph.literal_count):
+        if tout[node] != program.NOT_VISITED:
+            continue
+        tout[node] = program.IN_PROGRESS
+        stack = [node]
+        while stack:
+            cur_node = stack[-1]
+            for idx in range(offsets[cur_node], offsets[cur_node + 1]):
+                next_cur_node = targets[idx]
+                if tout[next_cur_node] == program.NOT_VISITED:
+                    tout[next_cur_node] = program.IN_PROGRESS
+                    stack.append(next_cur_node)
+                    break
+            if stack[-1] == cur_node:
+                tout[cur_node] = time_
+                time_ += 1
+                del stack[-1]
+    return tout
+
+
+def setup_components_repush(reverse_graph: program.ImplicationGraph,
+                             order: array):
+    # Second pass as it was before nodes were painted on push: a node is
+    # pushed once for every painted neighbour that reaches it and painted
+    # when popped. Returns the components and the deepest stack.
+    offsets = reverse_graph.offsets
+    targets = reverse_graph.targets
+    component = array('i', [-1]) * reverse_graph.literal_count
+    cur_component = 0
+    max_depth = 0
+    for val in order:
+        if component[val] != -1:
+            continue
+        stack = [val]
+        while stack:
+            cur_node = stack.pop()
+            component[cur_node] = cur_component
+            for idx in range(offsets[cur_node], offsets[cur_node + 1]):
+                next_node = targets[idx]
+                if component[next_node] == -1:
+                    stack.append(next_node)
+            if len(stack) > max_depth:
+                max_depth = len(stack)
+        cur_component += 1
+    return component, max_depth
+
+
+def graph_with_duplicates(literal_count: int, sources, targets):
+    # Implication graph as it was built before deduplication: every edge
+    # kept, in input order within its source.
+    sources = np.asarray(sources)
+    targets = np.asarray(targets)
+    offsets = np.zeros(literal_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=literal_count), out=offsets[1:])
+    edges = targets[np.argsort(sources, kind='stable')]
+    return program.ImplicationGraph(literal_count,
+                                    program.to_array('q', offsets),
+                                    program.to_array('i', edges))
+
+
+def measure(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def dense_graph(n: int, seed: int):
+    return create_graph_csv.PlantedGraph(n, seed=seed).rows()
+
+
+def star_graph(n: int, seed: int):
+    random.seed(seed)
+    return [[0, leaf, "red", random.choice(["green", "blue"])]
+            for leaf in range(1, n + 1)]
+
+
+def bench_first_pass(family, sizes: list, seed: int):
+    print(f'{family.__name__}:')
+    print(f'{"vertices":>8} {"edges":>10} {"rescan, s":>10} '
+          f'{"cursor, s":>10} {"speedup":>8}')
+    for n in sizes:
+        graph = program.build_graph(family(n, seed))[2]
+        rescan_time, rescan_tout = measure(fill_out_times_rescan, graph)
+        cursor_time, cursor_tout = measure(program.fill_out_times, graph)
+        assert rescan_tout == cursor_tout
+        print(f'{n:>8} {graph.edge_count:>10} {rescan_time:>10.3f} '
+              f'{cursor_time:>10.3f} {rescan_time / cursor_time:>7.1f}x')
+
+
+def bench_second_pass(sizes: list, seed: int):
+    # Dense planted graphs as create_graph_csv.create_graph makes them.
+    print(f'{"vertices":>8} {"edges":>10} {"repush, s":>10} {"paint, s":>9} '
+          f'{"repush stack":>13} {"paint stack":>12} {"repush, MiB":>12} '
+          f'{"paint, MiB":>11}')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "graph.csv")
+        for n in sizes:
+            create_graph_csv.PlantedGraph(n, seed=seed).write_csv(path)
+            graph = program.build_graph_from_columns(
+                *program.read_columns(path))[2]
+            order = program.order_by_out_time(program.fill_out_times(graph))
+            reverse_graph = graph.reversed()
+
+            metrics = instrumentation.Metrics()
+            repush_time, (repush, repush_depth) = measure(
+                setup_components_repush, reverse_graph, order)
+            paint_time, component = measure(
+                program.setup_components, reverse_graph, order, metrics)
+            assert repush == component
+            repush_memory = peak_memory(setup_components_repush,
+                                        reverse_graph, order)
+            paint_memory = peak_memory(program.setup_components,
+                                       reverse_graph, order)
+            print(f'{n:>8} {graph.edge_count:>10} {repush_time:>10.3f} '
+                  f'{paint_time:>9.3f} {repush_depth:>13} '
+                  f'{metrics.counters["paint_max_stack_depth"]:>12} '
+                  f'{repush_memory / 2 ** 20:>12.2f} '
+                  f'{paint_memory / 2 ** 20:>11.2f}')
+
+
+def bench_duplicates(sizes: list, copies: int, seed: int, solver: str):
+    # Planted graphs whose every edge is listed copies times in each
+    # direction, as when edge lists from several sources are merged.
+    print(f'{copies} copies of every edge in each direction, {solver}:')
+    print(f'{"vertices":>8} {"rows":>9} {"raw edges":>10} {"kept":>9} '
+          f'{"with duplicates, s":>19} {"deduplicated, s":>16} '
+          f'{"speedup":>8}')
+    for n in sizes:
+        planted = create_graph_csv.PlantedGraph(n, seed=seed)
+        first = np.concatenate([first for first, _ in planted.chunks()])
+        second = np.concatenate([second for _, second in planted.chunks()])
+        first, second = (np.concatenate([first, second] * copies),
+                         np.concatenate([second, first] * copies))
+        colors = np.array(program.COLORS)[planted.old_colors]
+        names, node_colors, graph = program.build_graph_from_columns(
+            first, second, colors[first - 1], colors[second - 1])
+
+        builder = program.StreamingGraphBuilder()
+        ids = builder.intern_columns(first, second, colors[first - 1],
+                                     colors[second - 1])
+        raw = graph_with_duplicates(
+            graph.literal_count, *program.link_statements_vectorized(
+                *ids, np.frombuffer(builder.node_colors, dtype=np.int8)))
+
+        raw_time = min(measure(program.find_components, raw, solver)[0]
+                       for _ in range(3))
+        kept_time = min(measure(program.find_components, graph, solver)[0]
+                        for _ in range(3))
+        print(f'{n:>8} {len(first):>9} {raw.edge_count:>10} '
+              f'{graph.edge_count:>9} {raw_time:>19.3f} {kept_time:>16.3f} '
+              f'{raw_time / kept_time:>7.1f}x')
+
+
+def bench_preprocess(families: list, sizes: list, solver: str, seed: int):
+    # SCC passes over the whole graph against preprocessing plus the
+    # passes over the residual graph, per suite family.
+    print(f'{"family":>13} {"size":>8} {"literals":>9} {"edges":>9} '
+          f'{"residual":>9} {"edges":>9} {"full, s":>8} {"reduced, s":>11}')
+    for family in families:
+        generate, default_sizes = SUITE[family]
+        for n in sizes or default_sizes:
+            random.seed(seed)
+            node_colors, graph = program.build_graph(generate(n))[1:]
+            full_time = measure(solve_or_conflict, solve_full, graph,
+                                node_colors, solver)[0]
+            metrics = instrumentation.Metrics()
+            reduced_time = measure(solve_or_conflict, program.solve_reduced,
+                                   graph, node_colors, solver, metrics)[0]
+            residual = metrics.counters.get("residual_literals", "-")
+            residual_edges = metrics.counters.get("residual_edges", "-")
+            print(f'{family:>13} {n:>8} {graph.literal_count:>9} '
+                  f'{graph.edge_count:>9} {residual:>9} {residual_edges:>9} '
+                  f'{full_time:>8.3f} {reduced_time:>11.3f}')
+
+
+def solve_full(graph: program.ImplicationGraph, node_colors: array,
+               solver: str) -> array:
+    return program.select_colors(program.find_components(graph, solver),
+                                 node_colors)
+
+
+def solve_or_conflict(solve, *args):
+    try:
+        return solve(*args)
+    except program.UnsatisfiableError as error:
+        return error
+
+
+def bench_cache(families: list, sizes: list, solver: str, seed: int):
+    # A CLI solve without the cache against a miss, a hit from the
+    # directory for the same rows shuffled and swapped end to end, and a
+    # hit from memory. lookup is the part of a run spent on the key.
+    print(f'{"family":>13} {"size":>8} {"plain, s":>9} {"miss, s":>8} '
+          f'{"disk hit, s":>12} {"memory hit, s":>14} {"lookup, s":>10}')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "graph.csv")
+        shuffled_path = os.path.join(directory, "shuffled.csv")
+        output_path = os.path.join(directory, "output_file.txt")
+        for family in families:
+            generate, default_sizes = SUITE[family]
+            for n in sizes or default_sizes:
+                random.seed(seed)
+                rows = generate(n)
+                columns = ['vertex1', 'vertex2', 'color1', 'color2']
+                pd.DataFrame(rows, columns=columns).to_csv(path, index=False)
+                random.shuffle(rows)
+                pd.DataFrame([(b, a, color_b, color_a) for a, b, color_a,
+                              color_b in rows], columns=columns).to_csv(
+                    shuffled_path, index=False)
+
+                cache_directory = os.path.join(directory, f'{family}_{n}')
+                cache = result_cache.ResultCache(cache_directory)
+                plain = run_main(path, solver, output_path)[0]
+                miss = run_main(path, solver, output_path, cache)[0]
+                disk_hit, metrics = run_main(
+                    shuffled_path, solver, output_path,
+                    result_cache.ResultCache(cache_directory))
+                memory_hit = run_main(shuffled_path, solver, output_path,
+                                      cache)[0]
+                print(f'{family:>13} {n:>8} {plain:>9.3f} {miss:>8.3f} '
+                      f'{disk_hit:>12.3f} {memory_hit:>14.3f} '
+                      f'{metrics.stages["cache lookup"]:>10.3f}')
+
+
+def run_main(path: str, solver: str, output_path: str,
+             cache: result_cache.ResultCache = None, chunksize: int = None,
+             preprocess: bool = False):
+    metrics = instrumentation.Metrics()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), \
+            contextlib.redirect_stderr(io.StringIO()):
+        try:
+            program.main(solver, chunksize, path, metrics, output_path,
+                         preprocess=preprocess, cache=cache)
+        except SystemExit:
+            pass
+    return time.perf_counter() - start, metrics
+
+
+def bench_parallel(sizes: list, edges_per_vertex: int, workers: list,
+                   seed: int):
+    # Single-threaded Tarjan against FW-BW on pools of several sizes, on
+    # one connected planted graph per size.
+    print(f'{"vertices":>10} {"implications":>13} {"solver":>12} '
+          f'{"seconds":>8} {"splits":>7} {"trimmed":>10} {"tarjan":>10}')
+    for n in sizes:
+        planted = create_graph_csv.PlantedGraph(n, edges_per_vertex * n,
+                                                seed=seed)
+        first, second = (np.concatenate(ends) - 1 for ends in
+                         zip(*planted.chunks()))
+        sources, targets = program.link_statements_vectorized(
+            first.astype(np.int32), second.astype(np.int32),
+            planted.old_colors)
+        graph = program.ImplicationGraph.from_edges(2 * n, sources, targets)
+        del first, second, sources, targets
+        tarjan_time = measure(program.tarjan_components, graph)[0]
+        print(f'{n:>10} {graph.edge_count:>13} {"tarjan":>12} '
+              f'{tarjan_time:>8.2f}')
+        for count in workers:
+            metrics = instrumentation.Metrics()
+            seconds = measure(parallel_scc.parallel_components, graph,
+                              count, metrics)[0]
+            counters = metrics.counters
+            print(f'{n:>10} {graph.edge_count:>13} '
+                  f'{f"fwbw x{count}":>12} {seconds:>8.2f} '
+                  f'{counters["fwbw_splits"]:>7} '
+                  f'{counters["trimmed_literals"]:>10} '
+                  f'{counters["sequential_literals"]:>10}')
+
+
+# Thresholds for verify_parallel: every range split down to single
+# literals, searches that give up early with ranges that fall back to
+# Tarjan early, the defaults, and the pool with chunked search levels.
+# Pool workers see the shrunk thresholds where they are forked.
+PARALLEL_SETTINGS = [
+    ({"SEQUENTIAL_LITERALS": 2, "NARROW_FRONTIER": 1,
+      "NARROW_LEVELS": 1 << 30, "PROGRESS": 1.1}, 1),
+    ({"SEQUENTIAL_LITERALS": 8, "NARROW_FRONTIER": 4, "NARROW_LEVELS": 3,
+      "PROGRESS": 0.5}, 1),
+    ({}, 1),
+    ({"POOL_EDGES": 0, "SEQUENTIAL_LITERALS": 4, "NARROW_FRONTIER": 2,
+      "NARROW_LEVELS": 8, "PROGRESS": 0.95, "CHUNK_FRONTIER": 2}, 2),
+]
+
+
+def verify_parallel(graphs: int, seed: int):
+    # parallel_components against the transitive closure of random and
+    # path-like graphs: one component per set of literals that reach each
+    # other, numbered in topological order by where they start.
+    rng = np.random.default_rng(seed)
+    defaults = {name: getattr(parallel_scc, name) for name in
+                {name for setting, _ in PARALLEL_SETTINGS
+                 for name in setting}}
+    try:
+        for setting, workers in PARALLEL_SETTINGS:
+            for name, value in defaults.items():
+                setattr(parallel_scc, name, setting.get(name, value))
+            totals = {}
+            trials = graphs if workers == 1 else max(1, graphs // 10)
+            for trial in range(trials):
+                literal_count = int(rng.integers(1, 300 if workers > 1
+                                                 else 120))
+                sources, targets = random_implications(
+                    literal_count, trial % 2 == 1, rng)
+                graph = program.ImplicationGraph.from_edges(
+                    literal_count, sources, targets)
+                metrics = instrumentation.Metrics()
+                component = np.frombuffer(parallel_scc.parallel_components(
+                    graph, workers, metrics), dtype=np.int32)
+                check_components(component, literal_count, sources, targets)
+                for name, value in metrics.counters.items():
+                    totals[name] = totals.get(name, 0) + value
+            print(f'{trials} graphs, {workers} workers, '
+                  f'{setting or "defaults"}: {totals}')
+    finally:
+        for name, value in defaults.items():
+            setattr(parallel_scc, name, value)
+
+
+def random_implications(literal_count: int, path: bool, rng):
+    # Uniform random edges, or a path with a few edges back along it.
+    if not path:
+        edge_count = int(rng.integers(0, 3 * literal_count))
+        return (rng.integers(0, literal_count, edge_count, dtype=np.int32),
+                rng.integers(0, literal_count, edge_count, dtype=np.int32))
+    forward = np.arange(literal_count - 1, dtype=np.int32)
+    back = forward[rng.random(len(forward)) < 0.05] + 1
+    back_to = np.maximum(back - rng.integers(1, 6, len(back)), 0)
+    return (np.concatenate([forward, back]).astype(np.int32),
+            np.concatenate([forward + 1, back_to]).astype(np.int32))
+
+
+def check_components(component: np.ndarray, literal_count: int,
+                     sources: np.ndarray, targets: np.ndarray):
+    reaches = np.eye(literal_count, dtype=bool)
+    reaches[sources, targets] = True
+    while True:
+        closure = reaches | (reaches @ reaches)
+        if (closure == reaches).all():
+            break
+        reaches = closure
+    same = reaches & reaches.T
+    assert (same == (component[:, None] == component[None, :])).all(), \
+        'Components are not the strongly connected components'
+    assert (~reaches | same |
+            (component[:, None] < component[None, :])).all(), \
+        'Components are not numbered in topological order'
+    starts, sizes = np.unique(component, return_counts=True)
+    assert (starts == np.cumsum(sizes) - sizes).all(), \
+        'Components are not numbered by where they start'
+
+
+def peak_memory(function, *args) -> int:
+    # Peak of the memory allocated while function runs, past its inputs.
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def bench_solvers(family, sizes: list, seed: int):
+    print(f'{family.__name__}:')
+    header = ''.join(f' {solver + ", s":>12}' for solver in program.SOLVERS)
+    print(f'{"vertices":>8} {"edges":>10}{header}')
+    for n in sizes:
+        graph = program.build_graph(family(n, seed))[2]
+        timings = ''
+        for solver in program.SOLVERS:
+            elapsed = measure(program.find_components, graph, solver)[0]
+            timings += f' {elapsed:>12.3f}'
+        print(f'{n:>8} {graph.edge_count:>10}{timings}')
+
+
+def bench_incremental(family, sizes: list, seed: int, inserts: int = 200):
+    # The last inserted edges of a shuffled graph arrive one at a time;
+    # a full re-solve per arrival is compared with IncrementalSolver.
+    print(f'{family.__name__}, {inserts} insertions:')
+    print(f'{"vertices":>8} {"edges":>10} {"re-solve, ms":>13} '
+          f'{"incremental, ms":>16} {"speedup":>8}')
+    for n in sizes:
+        rows = family(n, seed)
+        random.Random(seed).shuffle(rows)
+        known = rows[:-inserts]
+        colors = {}
+        for name1, name2, color1, color2 in rows:
+            colors.setdefault(name1, color1)
+            colors.setdefault(name2, color2)
+
+        solver = incremental.IncrementalSolver(
+            [row[:2] for row in known], colors)
+        start = time.perf_counter()
+        for row in rows[-inserts:]:
+            result = solver.add_edge(*row)
+        incremental_time = (time.perf_counter() - start) / inserts
+
+        repeats = 3
+        start = time.perf_counter()
+        for _ in range(repeats):
+            full = program.solve([row[:2] for row in rows], colors)
+        full_time = (time.perf_counter() - start) / repeats
+        assert result.satisfiable == full.satisfiable
+
+        print(f'{n:>8} {len(rows):>10} {full_time * 1000:>13.2f} '
+              f'{incremental_time * 1000:>16.3f} '
+              f'{full_time / incremental_time:>7.0f}x')
+
+
+def verify_incremental(graphs: int, seed: int):
+    # IncrementalSolver against a full program.solve after every insert,
+    # on small random graphs whose later edges often make them
+    # unsatisfiable: both must agree on satisfiability, the changed colors
+    # must add up to the snapshot, and the snapshot must be a recoloring.
+    rng = random.Random(seed)
+    conflicts = inserts = 0
+    for _ in range(graphs):
+        vertex_count = rng.randint(2, 30)
+        colors = {vertex: rng.choice(program.COLORS)
+                  for vertex in range(vertex_count)}
+        rows = [tuple(rng.sample(range(vertex_count), 2))
+                for _ in range(rng.randint(1, 2 * vertex_count))]
+        known = rng.randint(1, len(rows))
+        solver = incremental.IncrementalSolver(
+            rows[:known], {vertex: colors[vertex]
+                           for row in rows[:known] for vertex in row})
+        start = solver.snapshot()
+        check_incremental(start, rows[:known], colors)
+        current = dict(start.colors) if start.satisfiable else None
+        for end in range(known + 1, len(rows) + 1):
+            name1, name2 = rows[end - 1]
+            result = solver.add_edge(name1, name2, colors[name1],
+                                     colors[name2])
+            inserts += 1
+            if result.satisfiable:
+                current.update(result.colors)
+                assert current == solver.snapshot().colors, \
+                    'Changed colors do not add up to the snapshot'
+            elif current is not None:
+                conflicts += 1
+                current = None
+            check_incremental(solver.snapshot(), rows[:end], colors)
+    print(f'{graphs} graphs, {inserts} inserts, {conflicts} inserts '
+          f'that made a graph unsatisfiable: OK')
+
+
+def check_incremental(result: program.Result, rows: list, colors: dict):
+    full = program.solve(rows, colors)
+    assert result.satisfiable == full.satisfiable, \
+        f'IncrementalSolver says satisfiable={result.satisfiable}'
+    if result.satisfiable:
+        assert not len(checker.verify_result(rows, colors, result)), \
+            'IncrementalSolver colors are not a recoloring'
+
+
+def sparse_family(n: int):
+    return create_graph_csv.generate_sparse_graph(n, 3 * n)
+
+
+def hub_family(n: int):
+    return create_graph_csv.generate_star(n, hubs=4)
+
+
+def dense_family(n: int):
+    # Seeded from random, which the suite seeds before every graph.
+    return create_graph_csv.PlantedGraph(
+        n, seed=random.getrandbits(63)).rows()
+
+
+SUITE = {
+    "dense": (dense_family, [250, 500, 1000]),
+    "sparse": (sparse_family, [10_000, 100_000]),
+    "chain": (create_graph_csv.generate_chain, [10_000, 100_000]),
+    "star": (hub_family, [10_000, 100_000]),
+    "unsatisfiable": (create_graph_csv.generate_unsatisfiable,
+                      [10_000, 100_000]),
+}
+STAGES = ["ingest", "graph build", "pass 1", "pass 2", "assignment",
+          "output"]
+
+
+def run_stages(path: str, solver: str, output_path: str,
+               options: dict) -> dict:
+    # The stages program.main times itself, so the suite measures the
+    # path the CLI takes for the same input and options. A stage that
+    # did not run, such as the passes on a cache hit, is missing.
+    metrics = run_main(path, solver, output_path, **options)[1]
+    counters = metrics.counters
+    return {"vertices": counters.get("vertices"),
+            "implication_edges": counters.get("implication_edges"),
+            "satisfiable": counters.get("satisfiable"),
+            "stages": metrics.stages,
+            "counters": counters}
+
+
+def bench_suite(families: list, sizes: list, solver: str, seed: int,
+                memory: bool, binary: bool = False,
+                options: dict = None) -> list:
+    # options are passed on to program.main: chunksize, preprocess and
+    # cache.
+    options = options or {}
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "graph.csv")
+        path = os.path.join(directory, "graph.bin") if binary else csv_path
+        output_path = os.path.join(directory, "output_file.txt")
+        for family in families:
+            generate, default_sizes = SUITE[family]
+            for n in sizes or default_sizes:
+                random.seed(seed)
+                rows = generate(n)
+                pd.DataFrame(rows, columns=['vertex1', 'vertex2', 'color1',
+                                            'color2']).to_csv(csv_path,
+                                                              index=False)
+                if binary:
+                    program.convert_to_binary(csv_path, path)
+                result = {"family": family, "size": n, "edges": len(rows)}
+                result.update(run_stages(path, solver, output_path, options))
+                if memory:
+                    tracemalloc.start()
+                    run_stages(path, solver, output_path, options)
+                    result["peak_memory"] = \
+                        tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                results.append(result)
+                print_suite_row(result)
+    return results
+
+
+def print_suite_row(result: dict):
+    timings = result["stages"]
+    stages = ' '.join(f'{timings.get(name, 0.0):>11.3f}'
+                      for name in STAGES)
+    stages += f' {sum(timings.values()):>11.3f}'
+    memory = result.get("peak_memory")
+    memory = f'{memory / 2 ** 20:>9.1f}' if memory is not None else ''
+    print(f'{result["family"]:>13} {result["size"]:>8} '
+          f'{result["edges"]:>9} {stages} {memory}')
+
+
+def print_suite_header():
+    stages = ' '.join(f'{name + ", s":>11}' for name in STAGES + ["total"])
+    print(f'{"family":>13} {"size":>8} {"edges":>9} {stages} '
+          f'{"peak, MiB":>9}')
+
+
+# Import time a small input may take before the solve starts, in seconds.
+STARTUP_TARGET = 0.1
+
+
+def bench_startup(sizes: list, repeats: int, seed: int):
+    # A full CLI run on small planted graphs: its wall time, the time
+    # python -X importtime reports for the imports, and whether NumPy
+    # was imported at all. The interpreter alone is timed for reference.
+    program_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "program.py")
+    interpreter = fastest_run([sys.executable, '-c', 'pass'], repeats)
+    print(f'python -c pass: {interpreter * 1000:.1f} ms, import target: '
+          f'{STARTUP_TARGET * 1000:.0f} ms')
+    print(f'{"vertices":>8} {"edges":>8} {"run, ms":>8} {"imports, ms":>12} '
+          f'{"numpy":>6} {"target":>7}')
+    with tempfile.TemporaryDirectory() as directory:
+        output_path = os.path.join(directory, "output_file.txt")
+        for n in sizes:
+            path = os.path.join(directory, f"graph_{n}.csv")
+            edges = create_graph_csv.PlantedGraph(n, seed=seed).write_csv(
+                path)
+            arguments = [program_path, '--input', path, '--output',
+                         output_path]
+            run_time = fastest_run([sys.executable] + arguments, repeats)
+            imports = import_times(subprocess.run(
+                [sys.executable, '-X', 'importtime'] + arguments, check=True,
+                capture_output=True, text=True).stderr)
+            import_time = sum(imports.values())
+            print(f'{n:>8} {edges:>8} {run_time * 1000:>8.1f} '
+                  f'{import_time * 1000:>12.1f} '
+                  f'{"yes" if "numpy.version" in imports else "no":>6} '
+                  f'{"ok" if import_time < STARTUP_TARGET else "over":>7}')
+
+
+def fastest_run(command: list, repeats: int) -> float:
+    return min(measure(subprocess.run, command, check=True,
+                       capture_output=True)[0] for _ in range(repeats))
+
+
+def import_times(report: str) -> dict:
+    # Own seconds of every module in a -X importtime report. Modules
+    # loaded through lazy_import have no line of their own, but all of
+    # their submodules do.
+    times = {}
+    for line in report.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        own, _, name = line[len('import time:'):].split('|')
+        if own.strip().isdigit():
+            times[name.strip()] = int(own) / 1e6
+    return times
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline_path: str, current_path: str):
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    with open(current_path, 'r', encoding='utf-8') as file:
+        current = json.load(file)
+    previous = {(result["family"], result["size"]): result
+                for result in baseline["results"]}
+
+    print(f'{baseline["commit"]} -> {current["commit"]} '
+          f'(current / baseline time)')
+    print(f'{"family":>13} {"size":>8} ' +
+          ' '.join(f'{name:>11}' for name in STAGES + ["total"]))
+    for result in current["results"]:
+        old = previous.get((result["family"], result["size"]))
+        if old is None:
+            continue
+        ratios = []
+        for name in STAGES + ["total"]:
+            new_time = sum(result["stages"].values()) \
+                if name == "total" else result["stages"].get(name, 0.0)
+            old_time = sum(old["stages"].values()) \
+                if name == "total" else old["stages"].get(name, 0.0)
+            ratios.append(f'{new_time / old_time:>10.2f}x'
+                          if old_time > 1e-4 else f'{"-":>11}')
+        print(f'{result["family"]:>13} {result["size"]:>8} ' +
+              ' '.join(ratios))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solver benchmarks")
+    commands = parser.add_subparsers(dest='bench', required=True)
+    for name in ["first-pass", "solvers", "incremental"]:
+        command = commands.add_parser(
+            name, help="compare on dense and star graphs")
+        command.add_argument('sizes', nargs='*', type=int,
+                             default=[250, 500, 1000, 2000])
+        command.add_argument('--seed', type=int, default=0)
+
+    suite = commands.add_parser(
+        'suite', help="time every stage of the pipeline per graph family")
+    suite.add_argument('--families', nargs='+', choices=list(SUITE),
+                       default=list(SUITE))
+    suite.add_argument('--sizes', nargs='+', type=int, default=None,
+                       help="sizes for every family instead of defaults")
+    suite.add_argument('--solver', choices=program.SOLVERS,
+                       default="kosaraju")
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--chunksize', type=int, default=None)
+    suite.add_argument('--preprocess', action='store_true')
+    suite.add_argument('--binary', action='store_true',
+                       help="solve the graphs converted to the binary format")
+    suite.add_argument('--cache', metavar='DIR', default=None)
+    suite.add_argument('--no-memory', action='store_true',
+                       help="skip the extra run that measures peak memory")
+    suite.add_argument('--output', default="benchmark_results.json")
+
+    second_pass = commands.add_parser(
+        'second-pass', help="compare the second Kosaraju pass with and "
+                            "without repeated pushes on dense graphs")
+    second_pass.add_argument('sizes', nargs='*', type=int,
+                             default=[250, 500, 1000, 2000])
+    second_pass.add_argument('--seed', type=int, default=0)
+
+    duplicates = commands.add_parser(
+        'duplicates', help="traverse graphs with repeated edges with and "
+                           "without deduplication")
+    duplicates.add_argument('sizes', nargs='*', type=int,
+                            default=[250, 500, 1000])
+    duplicates.add_argument('--copies', type=int, default=2)
+    duplicates.add_argument('--solver', choices=program.SOLVERS,
+                            default="tarjan")
+    duplicates.add_argument('--seed', type=int, default=0)
+
+    preprocess = commands.add_parser(
+        'preprocess', help="shrink suite graphs by literal contraction and "
+                           "forced-literal propagation before the passes")
+    preprocess.add_argument('--families', nargs='+', choices=list(SUITE),
+                            default=list(SUITE))
+    preprocess.add_argument('--sizes', nargs='+', type=int, default=None)
+    preprocess.add_argument('--solver', choices=program.SOLVERS,
+                            default="kosaraju")
+    preprocess.add_argument('--seed', type=int, default=0)
+
+    parallel = commands.add_parser(
+        'parallel', help="time FW-BW on pools of several sizes against "
+                         "Tarjan on one large connected graph")
+    parallel.add_argument('sizes', nargs='*', type=int,
+                          default=[1_000_000, 4_000_000])
+    parallel.add_argument('--edges-per-vertex', type=int, default=3)
+    parallel.add_argument('--workers', nargs='+', type=int,
+                          default=[1, 2, 4, 8])
+    parallel.add_argument('--seed', type=int, default=0)
+
+    verify_insert = commands.add_parser(
+        'verify-incremental', help="check IncrementalSolver against a "
+                                   "full solve after every insert")
+    verify_insert.add_argument('--graphs', type=int, default=300)
+    verify_insert.add_argument('--seed', type=int, default=0)
+
+    verify_fwbw = commands.add_parser(
+        'verify-parallel', help="check FW-BW components against the "
+                                "transitive closure of random graphs")
+    verify_fwbw.add_argument('--graphs', type=int, default=200,
+                             help="graphs per threshold setting")
+    verify_fwbw.add_argument('--seed', type=int, default=0)
+
+    cache = commands.add_parser(
+        'cache', help="time solves answered from the result cache")
+    cache.add_argument('--families', nargs='+', choices=list(SUITE),
+                       default=list(SUITE))
+    cache.add_argument('--sizes', nargs='+', type=int, default=None)
+    cache.add_argument('--solver', choices=program.SOLVERS,
+                       default="kosaraju")
+    cache.add_argument('--seed', type=int, default=0)
+
+    startup = commands.add_parser(
+        'startup', help="time CLI startup and imports on small inputs")
+    startup.add_argument('sizes', nargs='*', type=int,
+                         default=[10, 100, 300])
+    startup.add_argument('--repeats', type=int, default=5)
+    startup.add_argument('--seed', type=int, default=0)
+
+    compare = commands.add_parser(
+        'compare', help="compare two saved suite results")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    args = parser.parse_args()
+
+    if args.bench == "suite":
+        print_suite_header()
+        options = {"chunksize": args.chunksize,
+                   "preprocess": args.preprocess,
+                   "cache": result_cache.ResultCache.from_environment(
+                       args.cache)}
+        results = bench_suite(args.families, args.sizes, args.solver,
+                              args.seed, not args.no_memory, args.binary,
+                              options)
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump({"commit": current_commit(), "solver": args.solver,
+                       "seed": args.seed, "chunksize": args.chunksize,
+                       "preprocess": args.preprocess,
+                       "binary": args.binary, "cache": args.cache,
+                       "python": platform.python_version(),
+                       "results": results}, output, indent=2)
+    elif args.bench == "compare":
+        compare_results(args.baseline, args.current)
+    elif args.bench == "parallel":
+        bench_parallel(args.sizes, args.edges_per_vertex, args.workers,
+                       args.seed)
+    elif args.bench == "verify-incremental":
+        verify_incremental(args.graphs, args.seed)
+    elif args.bench == "verify-parallel":
+        verify_parallel(args.graphs, args.seed)
+    elif args.bench == "cache":
+        bench_cache(args.families, args.sizes, args.solver, args.seed)
+    elif args.bench == "preprocess":
+        bench_preprocess(args.families, args.sizes, args.solver, args.seed)
+    elif args.bench == "duplicates":
+        bench_duplicates(args.sizes, args.copies, args.seed, args.solver)
+    elif args.bench == "second-pass":
+        bench_second_pass(args.sizes, args.seed)
+    elif args.bench == "startup":
+        bench_startup(args.sizes, args.repeats, args.seed)
+    else:
+        bench = {"first-pass": bench_first_pass, "solvers": bench_solvers,
+                 "incremental": bench_incremental}[args.bench]
+        bench(dense_graph, args.sizes, args.seed)
+        bench(star_graph, [size * 10 for size in args.sizes], args.seed)
@@ -1,18 +1,116 @@
-import re
-
-
-def main():
-    colors = {}
-    with open("output_file.txt", 'r') as file:
-        for line in file:
-            node, color = re.findall(r'^(\d+) -> (\w+)', line)[0]
-            colors[node] = color
-    with open("graph.csv", 'r') as file:
-        for line in file:
-            if line == 'vertex1,vertex2,color1,color2\n' or line == '':continue
-            node1, node2, color1, color2 = \
-                re.findall(r'^([^,]+?),([^,]+?),([^,]+?),([^,]+?)', line)[0]
-            if colors[node1] == color1 or \
-                colors[node2] == color2 or \
-                colors[node1] == colors[node2]:
-                return f'NOOOO: {line}'
+from __future__ import annotations
+
+import argparse
+
+import program
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+MISSING = -1
+
+
+def main(graph_path: str = "graph.csv", output_path: str = "output_file.txt"):
+    # None when output_file.txt is a valid recoloring of graph.csv, the
+    # violating rows of graph.csv otherwise.
+    names1, names2, colors1, colors2 = read_graph_columns(graph_path)
+    names, new_colors = read_output(output_path)
+    if len({names1.dtype, names2.dtype, names.dtype}) > 1:
+        # Name columns parsed to different types are compared as text.
+        names1, names2, names = (column.astype(str)
+                                 for column in (names1, names2, names))
+    violations = verify_columns(names1, names2, colors1, colors2, names,
+                                new_colors)
+    if len(violations):
+        return format_violations(violations, names1, names2, colors1,
+                                 colors2)
+    return None
+
+
+def verify_result(edges, colors, result: program.Result) -> np.ndarray:
+    # Checks a program.solve result in memory, edges and colors as passed
+    # to program.solve.
+    new_colors = result.colors or {}
+    return verify_columns(*program.pairs_to_columns(edges, colors),
+                          list(new_colors), list(new_colors.values()))
+
+
+def verify_columns(names1, names2, colors1, colors2, names,
+                   new_colors) -> np.ndarray:
+    # Indices of the violating edges. names and new_colors give the new
+    # color of every vertex, by name or by code.
+    index = pd.Index(names)
+    if not index.is_unique:
+        raise ValueError('A vertex is colored more than once')
+    return find_violations(index.get_indexer(names1),
+                           index.get_indexer(names2), color_codes(colors1),
+                           color_codes(colors2), color_codes(new_colors))
+
+
+def color_codes(colors) -> np.ndarray:
+    colors = np.asarray(colors)
+    if colors.dtype.kind in 'iu':
+        return colors
+    return program.encode_colors(colors)
+
+
+def find_violations(first: np.ndarray, second: np.ndarray,
+                    colors1: np.ndarray, colors2: np.ndarray,
+                    new_colors) -> np.ndarray:
+    # An endpoint that is MISSING from the result picks the MISSING color
+    # appended at the end, which never passes.
+    new_colors = np.append(np.asarray(new_colors, dtype=np.int8), MISSING)
+    new1 = new_colors[first]
+    new2 = new_colors[second]
+    wrong = (new1 == colors1) | (new2 == colors2) | (new1 == new2)
+    wrong |= (new1 == MISSING) | (new2 == MISSING)
+    return np.flatnonzero(wrong)
+
+
+def read_graph_columns(path: str):
+    # Colors are read straight into their codes.
+    df = pd.read_csv(path, header=0,
+                     dtype={'color1': color_dtype(), 'color2': color_dtype()})
+    return (df['vertex1'].to_numpy(), df['vertex2'].to_numpy(),
+            categorical_codes(df['color1'], path),
+            categorical_codes(df['color2'], path))
+
+
+def read_output(path: str):
+    output = pd.read_csv(path, sep=' ', header=None,
+                         names=['name', 'arrow', 'color'],
+                         dtype={'color': color_dtype()})
+    if (output['arrow'] != '->').any():
+        line = int(np.flatnonzero(output['arrow'] != '->')[0]) + 1
+        raise ValueError(f'{path}:{line} is not a "vertex -> color" line')
+    return output['name'].to_numpy(), categorical_codes(output['color'], path)
+
+
+def color_dtype() -> pd.CategoricalDtype:
+    return pd.CategoricalDtype(program.COLORS)
+
+
+def categorical_codes(column: pd.Series, path: str) -> np.ndarray:
+    codes = column.cat.codes.to_numpy()
+    if (codes < 0).any():
+        raise ValueError(f'Unknown color in {path}')
+    return codes
+
+
+def format_violations(violations: np.ndarray, names1, names2, colors1,
+                      colors2) -> str:
+    rows = '\n'.join(f'{names1[edge]},{names2[edge]},'
+                     f'{program.COLORS[colors1[edge]]},'
+                     f'{program.COLORS[colors2[edge]]}'
+                     for edge in violations.tolist())
+    return f'NOOOO: {len(violations)} violating edges\n{rows}'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that output_file.txt recolors graph.csv")
+    parser.add_argument('--graph', default="graph.csv")
+    parser.add_argument('--output', default="output_file.txt")
+    args = parser.parse_args()
+    print(main(args.graph, args.output) or "OK")
@@ -1,58 +1,190 @@
+import argparse
 import signal
+import sys
 import time
 
-import pandas as pd
+import numpy as np
 import random
 
 import checker
+import graph_format
 import program
 
+# Pairs per Bernoulli mask, or edges per chunk for sparse graphs.
+CHUNK_SIZE = 1 << 22
+# Below this density edge positions are sampled instead of masked.
+DENSE_DENSITY = 0.05
 
-def add_edges(first_comp, second_comp, graph_data, vertex_color):
-    for v in first_comp:
-        for u in second_comp:
-            should_add = random.randint(0, 1)
-            if should_add:
-                graph_data.append([v, u, vertex_color[v], vertex_color[u]])
 
-
-def create_graph(n):
-    graph_data = []
+def planted_coloring(n):
     colors = ["red", "green", "blue"]
     vertex_color = [random.choice(colors) for _ in range(n + 1)]
-    green = []
-    red = []
-    blue = []
-    for i in range(1, n + 1):
-        if vertex_color[i] == "green":
-            a = random.choice([red, blue])
-            a.append(i)
-        elif vertex_color[i] == "blue":
-            a = random.choice([red, green])
-            a.append(i)
-        else:
-            a = random.choice([green, blue])
-            a.append(i)
-
-    add_edges(green, blue, graph_data, vertex_color)
-    add_edges(green, red, graph_data, vertex_color)
-    add_edges(red, blue, graph_data, vertex_color)
-
-    df = pd.DataFrame(graph_data,
-                      columns=['vertex1', 'vertex2', 'color1', 'color2'])
-    df.to_csv("graph.csv", index=False)
-    with open('reserve.txt', 'w') as out:
-        array = []
-        for a in red:
-            array.append((a, f'{a} -> red\n'))
-        for a in green:
-            array.append((a, f'{a} -> green\n'))
-        for a in blue:
-            array.append((a, f'{a} -> blue\n'))
-        out.write(''.join(map(lambda m: m[1],
-                              sorted(array, key=lambda m: m[0]))))
-
-    return len(graph_data)
+    new_color = [random.choice([color for color in colors if color != old])
+                 for old in vertex_color]
+    return vertex_color, new_color
+
+
+def add_planted_edge(v, u, graph_data, vertex_color, new_color):
+    if new_color[v] != new_color[u]:
+        graph_data.append([v, u, vertex_color[v], vertex_color[u]])
+
+
+def generate_sparse_graph(n, m):
+    graph_data = []
+    vertex_color, new_color = planted_coloring(n)
+    # Only vertices with different new colors are joined, so a graph with
+    # one new color has no edges at all.
+    if len(set(new_color[1:])) < 2:
+        return graph_data
+    while len(graph_data) < m:
+        v, u = random.sample(range(1, n + 1), 2)
+        add_planted_edge(v, u, graph_data, vertex_color, new_color)
+    return graph_data
+
+
+def generate_chain(n):
+    graph_data = []
+    vertex_color, new_color = planted_coloring(n)
+    for v in range(1, n):
+        new_color[v + 1] = random.choice(
+            [color for color in ["red", "green", "blue"]
+             if color not in (vertex_color[v + 1], new_color[v])])
+        add_planted_edge(v, v + 1, graph_data, vertex_color, new_color)
+    return graph_data
+
+
+def generate_star(n, hubs=1):
+    graph_data = []
+    vertex_color, new_color = planted_coloring(n)
+    for hub in range(1, hubs + 1):
+        for leaf in range(hubs + 1, n + 1):
+            add_planted_edge(hub, leaf, graph_data, vertex_color, new_color)
+    return graph_data
+
+
+def generate_unsatisfiable(n):
+    # A sparse planted graph with a triangle of equally colored vertices
+    # inside: they have only two colors left for three mutual neighbours.
+    graph_data = generate_sparse_graph(n, 2 * n)
+    triangle = random.sample(range(1, n + 1), 3)
+    color = random.choice(["red", "green", "blue"])
+    for v, u in ((0, 1), (1, 2), (2, 0)):
+        graph_data.append([triangle[v], triangle[u], color, color])
+    for row in graph_data:
+        for idx in (0, 1):
+            if row[idx] in triangle:
+                row[idx + 2] = color
+    return graph_data
+
+
+class PlantedGraph:
+    # A multipartite graph with a planted recoloring, generated with the
+    # NumPy RNG. Vertices 1..n get a random color and a random new color
+    # different from it; every pair of vertices with different new colors
+    # becomes an edge with probability density. The edges are produced in
+    # chunks, so the graph never has to fit in memory, and every pass over
+    # them yields the same edges.
+    n: int
+    density: float
+    old_colors: np.ndarray
+    new_colors: np.ndarray
+    classes: list
+    edge_seed: int
+
+    def __init__(self, n, edges=None, density=0.5, seed=None):
+        rng = np.random.default_rng(seed)
+        self.n = n
+        self.old_colors = rng.integers(0, 3, n).astype(np.int8)
+        self.new_colors = (self.old_colors + rng.integers(1, 3, n)) % 3
+        self.edge_seed = int(rng.integers(2 ** 63))
+        red, green, blue = (np.flatnonzero(self.new_colors == color) + 1
+                            for color in range(3))
+        self.classes = [(green, blue), (green, red), (red, blue)]
+        if edges is not None:
+            density = min(1.0, edges / max(1, self.pair_count()))
+        self.density = density
+
+    def pair_count(self):
+        return sum(len(first) * len(second) for first, second in self.classes)
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        # Yields arrays of first and second endpoints, about chunk_size
+        # edges at a time. Dense graphs draw a Bernoulli mask over a block
+        # of pairs; sparse ones draw the number of edges of a much larger
+        # block and then their positions in it.
+        rng = np.random.default_rng(self.edge_seed)
+        dense = self.density >= DENSE_DENSITY
+        block = chunk_size if dense else \
+            max(chunk_size, int(chunk_size / max(self.density, 1e-12)))
+        for first, second in self.classes:
+            pairs = len(first) * len(second)
+            for start in range(0, pairs, block):
+                size = min(block, pairs - start)
+                if dense:
+                    mask = rng.random(size, dtype=np.float32)
+                    index = np.flatnonzero(mask < self.density)
+                else:
+                    count = rng.binomial(size, self.density)
+                    index = np.sort(rng.integers(0, size, count))
+                    index = index[np.diff(index, prepend=-1) != 0]
+                index += start
+                yield first[index // len(second)], second[index % len(second)]
+
+    def rows(self):
+        # Every edge as a [vertex1, vertex2, color1, color2] list, for
+        # graphs small enough to keep in Python lists.
+        colors = np.array(program.COLORS)
+        rows = []
+        for first, second in self.chunks():
+            colors1 = colors[self.old_colors[first - 1]].tolist()
+            colors2 = colors[self.old_colors[second - 1]].tolist()
+            rows += map(list, zip(first.tolist(), second.tolist(), colors1,
+                                  colors2))
+        return rows
+
+    def write_csv(self, path="graph.csv", chunk_size=CHUNK_SIZE):
+        # Formatting the rows directly is about twice as fast as
+        # DataFrame.to_csv.
+        colors = np.array(program.COLORS)
+        with open(path, 'w', newline='') as out:
+            out.write('vertex1,vertex2,color1,color2\n')
+            edges = 0
+            for first, second in self.chunks(chunk_size):
+                rows = zip(first.tolist(), second.tolist(),
+                           colors[self.old_colors[first - 1]].tolist(),
+                           colors[self.old_colors[second - 1]].tolist())
+                out.write(''.join([f'{v},{u},{color1},{color2}\n'
+                                   for v, u, color1, color2 in rows]))
+                edges += len(first)
+        return edges
+
+    def write_binary(self, path="graph.bin", chunk_size=CHUNK_SIZE):
+        edges = 0
+
+        def zero_based():
+            nonlocal edges
+            for first, second in self.chunks(chunk_size):
+                edges += len(first)
+                yield first - 1, second - 1
+
+        graph_format.write_graph_chunks(path, np.arange(1, self.n + 1),
+                                        self.old_colors, zero_based())
+        return edges
+
+    def write_reserve(self, path='reserve.txt', chunk_size=CHUNK_SIZE):
+        with open(path, 'w') as out:
+            for start in range(0, self.n, chunk_size):
+                colors = self.new_colors[start:start + chunk_size].tolist()
+                out.write(''.join(
+                    f'{start + idx + 1} -> {program.COLORS[color]}\n'
+                    for idx, color in enumerate(colors)))
+
+
+def create_graph(n):
+    graph = PlantedGraph(n)
+    edges = graph.write_csv()
+    graph.write_reserve()
+    return edges
 
 
 class GracefulKiller:
@@ -67,6 +199,34 @@ class GracefulKiller:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Stress-test program.py on random graphs, or only "
+                    "generate one graph with --vertices")
+    parser.add_argument('--vertices', type=int, default=None)
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument('--edges', type=int, default=None,
+                      help="expected number of edges")
+    size.add_argument('--density', type=float, default=0.5,
+                      help="probability of every allowed edge")
+    parser.add_argument('--format', choices=['csv', 'binary'], default='csv')
+    parser.add_argument('--output', default=None,
+                        help="graph.csv or graph.bin by default")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    if args.vertices is not None:
+        start = time.perf_counter()
+        graph = PlantedGraph(args.vertices, args.edges, args.density,
+                             args.seed)
+        if args.format == 'csv':
+            m = graph.write_csv(args.output or "graph.csv", args.chunk_size)
+        else:
+            m = graph.write_binary(args.output or "graph.bin",
+                                   args.chunk_size)
+        graph.write_reserve(chunk_size=args.chunk_size)
+        print(f'{m} edges in {time.perf_counter() - start:.1f} s')
+        sys.exit()
+
     # n = int(input("Enter the number of vertices in a graph: "))
     max_working_time = 0
     edge_amount = -1
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from array import array
+
+from lazy_import import lazy_import
+
+# Only the writers need these.
+np = lazy_import('numpy')
+shutil = lazy_import('shutil')
+tempfile = lazy_import('tempfile')
+
+# Layout, little-endian, every section aligned to 8 bytes:
+#   header: magic, vertex count, edge count, name table size, name kind
+#   int8 color code of every vertex
+#   name table: int64 names, or int64 offsets + utf-8 blob for string names
+#   int32 first endpoints of the edges, int32 second endpoints
+MAGIC = b'RCGRAPH\x01'
+HEADER = struct.Struct('<8sqqqB7x')
+
+INT_NAMES = 0
+STR_NAMES = 1
+
+
+def is_binary(path: str) -> bool:
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def write_graph(path: str, names: list, colors, first, second):
+    write_graph_chunks(path, names, colors, [(first, second)])
+
+
+def write_graph_chunks(path: str, names, colors, chunks):
+    # chunks yields (first, second) endpoint arrays, so the edges never
+    # have to be in memory at once. Second endpoints are spooled to a
+    # temporary file until the first ones are written, and the edge count
+    # in the header is filled in at the end.
+    name_table, name_kind = build_name_table(names)
+    names_size = sum(part.nbytes for part in name_table)
+    edge_count = 0
+    with open(path, 'wb') as file, tempfile.TemporaryFile(
+            dir=os.path.dirname(os.path.abspath(path))) as spool:
+        file.write(HEADER.pack(MAGIC, len(names), 0, names_size, name_kind))
+        write_section(file, np.asarray(colors, dtype=np.int8))
+        for part in name_table:
+            file.write(part.tobytes())
+        write_padding(file, names_size)
+
+        for first, second in chunks:
+            file.write(np.asarray(first, dtype=np.int32).tobytes())
+            spool.write(np.asarray(second, dtype=np.int32).tobytes())
+            edge_count += len(first)
+        write_padding(file, 4 * edge_count)
+        spool.seek(0)
+        shutil.copyfileobj(spool, file)
+        write_padding(file, 4 * edge_count)
+
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, len(names), edge_count, names_size,
+                               name_kind))
+
+
+def build_name_table(names):
+    if isinstance(names, np.ndarray) and names.dtype.kind in 'iu' or \
+            all(type(name) is int and -2 ** 63 <= name < 2 ** 63
+                for name in names):
+        return [np.asarray(names, dtype=np.int64)], INT_NAMES
+    encoded = [str(name).encode('utf-8') for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+    return [offsets, np.frombuffer(b''.join(encoded), np.uint8)], STR_NAMES
+
+
+def write_section(file, values: np.ndarray):
+    file.write(values.tobytes())
+    write_padding(file, values.nbytes)
+
+
+def write_padding(file, size: int):
+    file.write(bytes(-size % 8))
+
+
+def read_graph(path: str):
+    # All arrays are views over a read-only memory map of the file.
+    with open(path, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return read_graph_buffer(mapped, path)
+
+
+def read_graph_buffer(mapped, source: str = 'buffer'):
+    # Same as read_graph over any buffer, e.g. the body of a request.
+    vertex_count, edge_count, name_kind, positions = layout(mapped, source)
+    colors_at, names_at, names_end, first_at, second_at = positions
+    colors = np.frombuffer(mapped, np.int8, vertex_count, colors_at)
+
+    if name_kind == INT_NAMES:
+        names = np.frombuffer(mapped, np.int64, vertex_count, names_at)
+    else:
+        offsets = np.frombuffer(mapped, np.int64, vertex_count + 1, names_at)
+        names = decode_names(bytes(mapped[names_at + offsets.nbytes:
+                                          names_end]), offsets.tolist())
+
+    first = np.frombuffer(mapped, np.int32, edge_count, first_at)
+    second = np.frombuffer(mapped, np.int32, edge_count, second_at)
+    return names, colors, first, second
+
+
+def read_graph_arrays(path: str):
+    # Same as read_graph with stdlib arrays and a list of names, for files
+    # small enough that importing NumPy would take longer than reading.
+    with open(path, 'rb') as file:
+        data = file.read()
+    vertex_count, edge_count, name_kind, positions = layout(data, path)
+    colors_at, names_at, names_end, first_at, second_at = positions
+    colors = array('b', data[colors_at:colors_at + vertex_count])
+
+    if name_kind == INT_NAMES:
+        names = array('q', data[names_at:names_at + 8 * vertex_count])
+        names = names.tolist()
+    else:
+        offsets_end = names_at + 8 * (vertex_count + 1)
+        offsets = array('q', data[names_at:offsets_end]).tolist()
+        names = decode_names(data[offsets_end:names_end], offsets)
+
+    first = array('i', data[first_at:first_at + 4 * edge_count])
+    second = array('i', data[second_at:second_at + 4 * edge_count])
+    if len(colors) != vertex_count or len(second) != edge_count:
+        raise ValueError(f'{path} is truncated')
+    return names, colors, first, second
+
+
+def layout(buffer, source: str):
+    # Vertex count, edge count, name kind and the start of every section:
+    # colors, names, the end of the names, first and second endpoints.
+    if len(buffer) < HEADER.size:
+        raise ValueError(f'{source} is not a binary graph file')
+    magic, vertex_count, edge_count, names_size, name_kind = \
+        HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError(f'{source} is not a binary graph file')
+
+    colors_at = HEADER.size
+    names_at = colors_at + aligned(vertex_count)
+    first_at = names_at + aligned(names_size)
+    second_at = first_at + aligned(4 * edge_count)
+    return vertex_count, edge_count, name_kind, (
+        colors_at, names_at, names_at + names_size, first_at, second_at)
+
+
+def decode_names(blob: bytes, offsets: list) -> list:
+    return [blob[start:end].decode('utf-8')
+            for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def aligned(size: int) -> int:
+    return size + -size % 8
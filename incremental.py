@@ -0,0 +1,195 @@
+from array import array
+
+import program
+
+
+class IncrementalSolver:
+    # Keeps the implication graph, its strongly connected components and a
+    # topological order of them between edge insertions. An insertion that
+    # goes against the order is repaired with the Pearce-Kelly algorithm,
+    # which only visits components ordered between the ends of the new
+    # edge, and components closed into a cycle are merged on the way.
+    # add_edge only returns the colors that changed; snapshot copies all
+    # of them.
+    node_names: dict
+    node_colors: array
+    colors: dict
+    changed: dict
+    conflict = None
+
+    def __init__(self, edges=(), colors=None):
+        node_names, self.node_colors, graph = \
+            program.build_graph_from_pairs(edges, colors or {})
+        self.names = program.restore_names(node_names)
+        self.node_names = dict(zip(self.names, range(len(self.names))))
+        self.graph = graph
+        self.reverse_graph = graph.reversed()
+        self.extra_out = {}
+        self.extra_in = {}
+        self.changed = {}
+
+        try:
+            component = program.tarjan_components(graph)
+        except program.UnsatisfiableError as error:
+            self.conflict = self.names[error.vertex]
+            self.colors = {}
+            return
+        self.parent = array('i', range(graph.literal_count))
+        self.order = array('q', [0]) * graph.literal_count
+        self.members = {}
+        representative = {}
+        for literal in range(graph.literal_count):
+            rep = representative.setdefault(component[literal], literal)
+            self.parent[literal] = rep
+            self.order[rep] = component[literal]
+            self.members.setdefault(rep, []).append(literal)
+        self.next_order = graph.literal_count
+
+        self.colors = {}
+        for vertex, name in enumerate(self.names):
+            if not self.update_color(vertex):
+                self.conflict = name
+                break
+
+    def add_edge(self, name1, name2, color1: str, color2: str):
+        # A Result with the new colors of the vertices whose color changed
+        # or that were added, in a dict of its own.
+        if self.conflict is not None:
+            return program.Result(conflict=self.conflict)
+
+        self.changed = {}
+        first = self.add_vertex_if_new(name1, color1)
+        second = self.add_vertex_if_new(name2, color2)
+        sources = array('i')
+        targets = array('i')
+        program.set_statements_links(first, second, self.node_colors,
+                                     sources, targets)
+
+        for source, target in zip(sources, targets):
+            vertex = self.insert_implication(source, target)
+            if vertex is not None:
+                self.conflict = self.names[vertex]
+                return program.Result(conflict=self.conflict)
+        return program.Result(self.changed)
+
+    def snapshot(self):
+        # A Result with the current color of every vertex.
+        if self.conflict is not None:
+            return program.Result(conflict=self.conflict)
+        return program.Result(dict(self.colors))
+
+    def add_vertex_if_new(self, name, color: str) -> int:
+        vertex = self.node_names.get(name)
+        if vertex is not None:
+            return vertex
+
+        code = program.COLOR_CODES.get(color)
+        if code is None:
+            raise ValueError(f'Unknown color: {color}')
+        vertex = len(self.names)
+        self.node_names[name] = vertex
+        self.names.append(name)
+        self.node_colors.append(code)
+        for literal in (2 * vertex, 2 * vertex + 1):
+            self.parent.append(literal)
+            self.order.append(self.next_order)
+            self.next_order += 1
+            self.members[literal] = [literal]
+        self.update_color(vertex)
+        return vertex
+
+    def insert_implication(self, source: int, target: int):
+        self.extra_out.setdefault(source, []).append(target)
+        self.extra_in.setdefault(target, []).append(source)
+
+        tail = self.find(source)
+        head = self.find(target)
+        lower = self.order[head]
+        upper = self.order[tail]
+        if tail == head or upper < lower:
+            return None
+
+        forward = self.search(head, self.successors,
+                              lambda rep: self.order[rep] <= upper)
+        backward = self.search(tail, self.predecessors,
+                               lambda rep: self.order[rep] >= lower)
+        cycle = forward & backward
+
+        slots = sorted(self.order[rep] for rep in forward | backward)
+        by_order = self.order.__getitem__
+        lower_part = sorted(backward - cycle, key=by_order)
+        upper_part = sorted(forward - cycle, key=by_order)
+        if cycle:
+            lower_part.append(self.merge(cycle))
+        # Moving backward-reached components to the lowest of the freed
+        # slots and forward-reached ones to the highest keeps the order
+        # valid for every component that was not visited.
+        for rep, slot in zip(lower_part, slots):
+            self.order[rep] = slot
+        for rep, slot in zip(upper_part, slots[-len(upper_part):]):
+            self.order[rep] = slot
+
+        moved = lower_part + upper_part
+        for rep in moved:
+            for literal in self.members[rep]:
+                if not self.update_color(literal >> 1):
+                    return literal >> 1
+        return None
+
+    def search(self, start: int, neighbours, inside) -> set:
+        visited = {start}
+        stack = [start]
+        while stack:
+            for rep in neighbours(stack.pop()):
+                if rep not in visited and inside(rep):
+                    visited.add(rep)
+                    stack.append(rep)
+        return visited
+
+    def successors(self, rep: int):
+        return self.adjacent(rep, self.graph, self.extra_out)
+
+    def predecessors(self, rep: int):
+        return self.adjacent(rep, self.reverse_graph, self.extra_in)
+
+    def adjacent(self, rep: int, graph: program.ImplicationGraph,
+                 extra: dict):
+        offsets = graph.offsets
+        targets = graph.targets
+        for literal in self.members[rep]:
+            if literal < graph.literal_count:
+                for idx in range(offsets[literal], offsets[literal + 1]):
+                    yield self.find(targets[idx])
+            for target in extra.get(literal, ()):
+                yield self.find(target)
+
+    def merge(self, reps: set) -> int:
+        rep = max(reps, key=lambda member: len(self.members[member]))
+        for other in reps:
+            if other != rep:
+                self.parent[other] = rep
+                self.members[rep] += self.members.pop(other)
+        return rep
+
+    def find(self, literal: int) -> int:
+        parent = self.parent
+        root = literal
+        while parent[root] != root:
+            root = parent[root]
+        while parent[literal] != root:
+            parent[literal], literal = root, parent[literal]
+        return root
+
+    def update_color(self, vertex: int) -> bool:
+        positive = self.find(2 * vertex)
+        negative = self.find(2 * vertex + 1)
+        if positive == negative:
+            return False
+        color = program.POSSIBLE_COLORS[self.node_colors[vertex]][
+            self.order[positive] < self.order[negative]]
+        color = program.COLORS[color]
+        name = self.names[vertex]
+        if self.colors.get(name) != color:
+            self.colors[name] = color
+            self.changed[name] = color
+        return True
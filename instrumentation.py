@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+import sys
+import time
+
+from lazy_import import lazy_import
+
+# Only needed when metrics are on, which the solver does not pay for
+# at startup otherwise.
+cProfile = lazy_import('cProfile')
+np = lazy_import('numpy')
+pstats = lazy_import('pstats')
+tracemalloc = lazy_import('tracemalloc')
+
+ENV_METRICS = "RECOLOR_METRICS"
+ENV_PROFILE = "RECOLOR_PROFILE"
+ENV_TRACEMALLOC = "RECOLOR_TRACEMALLOC"
+
+PROFILE_TOP = 25
+TRACEMALLOC_TOP = 10
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    metrics: 'Metrics'
+    name: str
+    start: float
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        stages = self.metrics.stages
+        stages[self.name] = stages.get(self.name, 0.0) + elapsed
+        return False
+
+
+class Metrics:
+    # Stage timers and counters of one solve. A disabled instance turns
+    # every call into a no-op, so the solver can call it unconditionally.
+    enabled: bool
+    output: str
+    profile_path: str
+    trace_memory: bool
+
+    stages: dict
+    counters: dict
+
+    profiler = None
+    start_time: float = None
+
+    def __init__(self, enabled: bool = True, output: str = None,
+                 profile_path: str = None, trace_memory: bool = False):
+        self.enabled = enabled
+        self.output = output
+        self.profile_path = profile_path
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.counters = {}
+
+    @classmethod
+    def from_environment(cls, output: str = None, profile_path: str = None,
+                         trace_memory: bool = False) -> 'Metrics':
+        output = output or os.environ.get(ENV_METRICS)
+        profile_path = profile_path or os.environ.get(ENV_PROFILE)
+        trace_memory = trace_memory or \
+            os.environ.get(ENV_TRACEMALLOC, '') not in ('', '0')
+        if not (output or profile_path or trace_memory):
+            return NO_METRICS
+        return cls(True, output or '-', profile_path, trace_memory)
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    def count(self, name: str, value):
+        if self.enabled:
+            self.counters[name] = value
+
+    def maximum(self, name: str, value):
+        if self.enabled and (name not in self.counters or
+                             value > self.counters[name]):
+            self.counters[name] = value
+
+    def record_components(self, component):
+        if not self.enabled or not len(component):
+            return
+        sizes = np.bincount(np.frombuffer(component, dtype=np.int32))
+        sizes = sizes[sizes > 0]
+        self.count("scc_count", int(len(sizes)))
+        self.count("largest_scc", int(sizes.max()))
+
+    def start(self):
+        if not self.enabled:
+            return
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.profile_path:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start_time = time.perf_counter()
+
+    def finish(self):
+        if not self.enabled or self.start_time is None:
+            return
+        self.counters["total_seconds"] = \
+            time.perf_counter() - self.start_time
+        report = self.report()
+        if self.output:
+            text = json.dumps(report, indent=2)
+            if self.output == '-':
+                print(text, file=sys.stderr)
+            else:
+                with open(self.output, 'w', encoding='utf-8') as output:
+                    output.write(text)
+        self.start_time = None
+
+    def report(self) -> dict:
+        report = {"stages": dict(self.stages),
+                  "counters": dict(self.counters)}
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+            report["profile"] = profile_summary(self.profiler)
+            self.profiler = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            report["memory"] = {
+                "peak_bytes": tracemalloc.get_traced_memory()[1],
+                "top": [{"where": str(stat.traceback), "bytes": stat.size}
+                        for stat in snapshot.statistics('lineno')[
+                            :TRACEMALLOC_TOP]]}
+            tracemalloc.stop()
+        return report
+
+
+def profile_summary(profiler: cProfile.Profile) -> list:
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (_, calls, own, cumulative, _) in \
+            stats.stats.items():
+        rows.append({"function": f'{os.path.basename(filename)}:{line}'
+                                 f'({function})',
+                     "calls": calls, "own_seconds": own,
+                     "cumulative_seconds": cumulative})
+    rows.sort(key=lambda row: row["cumulative_seconds"], reverse=True)
+    return rows[:PROFILE_TOP]
+
+
+NO_METRICS = Metrics(enabled=False)
@@ -0,0 +1,20 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name: str):
+    # A module that is only executed on its first attribute access, so
+    # the solver can name numpy and pandas at the top of a file without
+    # paying their import time on paths that never use them.
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f'No module named {name!r}', name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
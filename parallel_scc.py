@@ -0,0 +1,454 @@
+import os
+from array import array
+from concurrent.futures import (FIRST_COMPLETED, Future, ProcessPoolExecutor,
+                                wait)
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+import program
+from instrumentation import NO_METRICS
+
+# Ranges of at most this many literals are finished by Tarjan in one
+# worker rather than split further.
+SEQUENTIAL_LITERALS = 1 << 14
+# Trimming stops at the first round that removes fewer literals, and a
+# reachability search gives up after NARROW_LEVELS levels this narrow:
+# such graphs are long paths, which Tarjan walks in one pass.
+NARROW_FRONTIER = 256
+NARROW_LEVELS = 64
+# A part holding more than this share of the range it was split from
+# goes to Tarjan too, so a pivot that only peels small components off
+# cannot make the splitting quadratic.
+PROGRESS = 0.9
+# Search levels of at least twice this many literals are expanded in
+# chunks by several workers.
+CHUNK_FRONTIER = 1 << 15
+# Smaller graphs are split in this process, without a pool.
+POOL_EDGES = 1 << 20
+
+# Arrays of the shared block, attached once per worker, and a scratch
+# array of the worker's own for distinct.
+arrays = None
+attached_memory = None
+scratch = None
+
+
+class SharedCSR:
+    # The graph and its reverse in CSR form, followed by the state of the
+    # decomposition, in one shared memory block:
+    #   vertices   literals ordered so that every range still to be split
+    #              is a slice and every finished component sits at its
+    #              place in topological order
+    #   slot       position of every literal in vertices
+    #   component  the position its component starts at, once finished
+    #   forward, backward  reachability marks of the current pivots
+    # Jobs on disjoint ranges only write the entries of their literals.
+    memory: SharedMemory
+    literal_count: int
+    edge_count: int
+
+    def __init__(self, graph, reverse_graph):
+        self.literal_count = graph.literal_count
+        self.edge_count = graph.edge_count
+        self.memory = SharedMemory(create=True, size=max(1, shared_size(
+            self.literal_count, self.edge_count)))
+        views = self.arrays()
+        views["offsets"][:] = np.frombuffer(graph.offsets, dtype=np.int64)
+        views["targets"][:] = np.frombuffer(graph.targets, dtype=np.int32)
+        views["reverse_offsets"][:] = np.frombuffer(reverse_graph.offsets,
+                                                    dtype=np.int64)
+        views["reverse_targets"][:] = np.frombuffer(reverse_graph.targets,
+                                                    dtype=np.int32)
+        views["vertices"][:] = np.arange(self.literal_count)
+        views["slot"][:] = views["vertices"]
+        views["component"][:] = -1
+        views["forward"][:] = 0
+        views["backward"][:] = 0
+
+    def spec(self) -> tuple:
+        return self.memory.name, self.literal_count, self.edge_count
+
+    def arrays(self) -> dict:
+        return shared_arrays(self.memory, self.literal_count,
+                             self.edge_count)
+
+    def release(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+# Name, type and length past the literal or edge count of every array.
+LAYOUT = [("offsets", np.int64, 1), ("reverse_offsets", np.int64, 1),
+          ("targets", np.int32, 0), ("reverse_targets", np.int32, 0),
+          ("vertices", np.int32, 0), ("slot", np.int32, 0),
+          ("component", np.int32, 0), ("forward", np.uint8, 0),
+          ("backward", np.uint8, 0)]
+
+
+class Search:
+    # One direction of the search from the pivot of a range.
+    start: int
+    end: int
+    forward: bool
+    pieces: list
+    waiting: int
+    narrow_levels: int
+
+    def __init__(self, start: int, end: int, forward: bool):
+        self.start = start
+        self.end = end
+        self.forward = forward
+        self.pieces = []
+        self.waiting = 0
+        self.narrow_levels = 0
+
+
+def shared_size(literal_count: int, edge_count: int) -> int:
+    return sum(aligned(np.dtype(dtype).itemsize *
+                       section_length(name, extra, literal_count, edge_count))
+               for name, dtype, extra in LAYOUT)
+
+
+def shared_arrays(memory: SharedMemory, literal_count: int,
+                  edge_count: int) -> dict:
+    views = {}
+    position = 0
+    for name, dtype, extra in LAYOUT:
+        length = section_length(name, extra, literal_count, edge_count)
+        views[name] = np.ndarray(length, dtype, memory.buf, position)
+        position += aligned(np.dtype(dtype).itemsize * length)
+    return views
+
+
+def section_length(name: str, extra: int, literal_count: int,
+                   edge_count: int) -> int:
+    return (edge_count if name.endswith("targets") else literal_count) + extra
+
+
+def aligned(size: int) -> int:
+    return size + -size % 8
+
+
+def attach(spec: tuple):
+    # Pool initializer. Pool workers share the resource tracker of the
+    # parent, which owns and unlinks the block.
+    global arrays, attached_memory, scratch
+    name, literal_count, edge_count = spec
+    attached_memory = SharedMemory(name=name)
+    arrays = shared_arrays(attached_memory, literal_count, edge_count)
+    scratch = np.empty(literal_count, dtype=np.int32)
+
+
+def parallel_components(graph, workers: int = None,
+                        metrics=NO_METRICS) -> array:
+    # Strongly connected components by forward-backward decomposition
+    # (FW-BW), numbered like find_components: by the position where the
+    # component starts in a topological order of the condensation, so
+    # the later component has the higher number.
+    #
+    # A range of literals is first trimmed: literals with no in or no out
+    # edges left inside the range are components of their own, and go to
+    # its front and back, round by round. For the rest a pivot is picked,
+    # the literals it reaches and the ones reaching it are marked, and
+    # the range is reordered as
+    #   reaches the pivot only | both: its component | neither | reached
+    # which is topological, since no edge goes from a later part to an
+    # earlier one. The three other parts are split on their own, so the
+    # pool works on more ranges at once the further the splitting goes;
+    # both searches run at once, and their wide levels are shared out in
+    # chunks.
+    global arrays, scratch
+    workers = workers or os.cpu_count() or 1
+    shared = SharedCSR(graph, graph.reversed())
+    pool = None
+    if workers > 1 and graph.edge_count >= POOL_EDGES:
+        pool = ProcessPoolExecutor(workers, initializer=attach,
+                                   initargs=(shared.spec(),))
+    else:
+        arrays = shared.arrays()
+        scratch = np.empty(graph.literal_count, dtype=np.int32)
+    counters = {"fwbw_splits": 0, "trimmed_literals": 0,
+                "sequential_literals": 0}
+    try:
+        run_jobs(pool, workers, graph.literal_count, counters)
+        component = array('i', shared.arrays()["component"].tobytes())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        else:
+            arrays = scratch = None
+        shared.release()
+    for name, value in counters.items():
+        metrics.count(name, value)
+    return component
+
+
+def run_jobs(pool, workers: int, literal_count: int, counters: dict):
+    pending = {}
+    # Directions still searching, and whether both finished, by the start
+    # of the range of their pivot.
+    pivots = {}
+
+    def submit(context, job, *args):
+        if pool is not None:
+            future = pool.submit(job, *args)
+        else:
+            future = Future()
+            future.set_result(job(*args))
+        pending[future] = job, args, context
+
+    def expand_level(search: Search, frontier: np.ndarray):
+        chunks = 1
+        if pool is not None and len(frontier) >= 2 * CHUNK_FRONTIER:
+            chunks = min(workers, len(frontier) // CHUNK_FRONTIER)
+        search.waiting = chunks
+        for chunk in np.array_split(frontier, chunks):
+            submit(search, expand, search.start, search.end, chunk,
+                   search.forward, NARROW_LEVELS - search.narrow_levels,
+                   chunks == 1)
+
+    def finish_search(search: Search, complete: bool):
+        state = pivots[search.start]
+        state[0] -= 1
+        state[1] = state[1] and complete
+        if not state[0]:
+            del pivots[search.start]
+            job = split_range if state[1] else solve_range
+            submit(None, job, search.start, search.end)
+
+    if literal_count:
+        submit(None, trim_range, 0, literal_count)
+    while pending:
+        for future in wait(pending, return_when=FIRST_COMPLETED)[0]:
+            job, args, search = pending.pop(future)
+            result = future.result()
+            if job is trim_range:
+                trimmed, solved, core = result
+                counters["trimmed_literals"] += trimmed
+                counters["sequential_literals"] += solved
+                if core is not None:
+                    start, end, pivot = core
+                    pivots[start] = [2, True]
+                    for forward in (True, False):
+                        expand_level(Search(start, end, forward),
+                                     np.array([pivot], dtype=np.int32))
+            elif job is expand:
+                frontier, narrow_levels = result
+                search.pieces.append(frontier)
+                search.narrow_levels += narrow_levels
+                search.waiting -= 1
+                if search.waiting:
+                    continue
+                if len(search.pieces) > 1:
+                    # Chunks may have found the same literals.
+                    frontier = np.unique(np.concatenate(search.pieces))
+                    if len(frontier) < NARROW_FRONTIER:
+                        search.narrow_levels += 1
+                search.pieces = []
+                if not len(frontier):
+                    finish_search(search, True)
+                elif search.narrow_levels > NARROW_LEVELS:
+                    finish_search(search, False)
+                else:
+                    expand_level(search, frontier)
+            elif job is split_range:
+                counters["fwbw_splits"] += 1
+                start, end = args
+                for part_start, part_end in result:
+                    if part_end - part_start > PROGRESS * (end - start):
+                        submit(None, solve_range, part_start, part_end)
+                    else:
+                        submit(None, trim_range, part_start, part_end)
+            else:
+                counters["sequential_literals"] += result
+
+
+def out_edges(offsets: np.ndarray, targets: np.ndarray, nodes: np.ndarray):
+    # The number of out edges of every node, and their targets.
+    starts = offsets[nodes]
+    counts = offsets[nodes + 1] - starts
+    ends = np.cumsum(counts)
+    edges = np.repeat(starts - ends + counts, counts) + \
+        np.arange(ends[-1] if len(ends) else 0)
+    return counts, targets[edges]
+
+
+def local_edges(offsets: np.ndarray, targets: np.ndarray,
+                nodes: np.ndarray, start: int):
+    # Edges between the literals of the range at start, as positions in
+    # it.
+    counts, targets = out_edges(offsets, targets, nodes)
+    sources = np.repeat(np.arange(len(nodes)), counts)
+    targets = arrays["slot"][targets].astype(np.int64) - start
+    inside = (targets >= 0) & (targets < len(nodes))
+    return sources[inside], targets[inside]
+
+
+def trim_range(start: int, end: int):
+    # Returns the numbers of literals trimmed and left to Tarjan, and the
+    # (start, end, pivot) of what is left to split, or None when the range
+    # is finished.
+    count = end - start
+    if count <= SEQUENTIAL_LITERALS:
+        return 0, solve_range(start, end), None
+    vertices = arrays["vertices"][start:end].copy()
+    if count == len(arrays["vertices"]):
+        out_degree = np.diff(arrays["offsets"])
+        in_degree = np.diff(arrays["reverse_offsets"])
+    else:
+        out_degree = np.bincount(local_edges(
+            arrays["offsets"], arrays["targets"], vertices, start)[0],
+            minlength=count)
+        in_degree = np.bincount(local_edges(
+            arrays["reverse_offsets"], arrays["reverse_targets"], vertices,
+            start)[0], minlength=count)
+
+    alive = np.ones(count, dtype=bool)
+    front = []
+    back = []
+    sources = np.flatnonzero(in_degree == 0)
+    sinks = np.flatnonzero((out_degree == 0) & (in_degree != 0))
+    removed = 0
+    while len(sources) + len(sinks) >= (NARROW_FRONTIER if removed else 1):
+        alive[sources] = False
+        alive[sinks] = False
+        front.append(sources)
+        back.append(sinks)
+        removed += len(sources) + len(sinks)
+        # Sources take in edges off the literals they point to, sinks out
+        # edges off the literals pointing to them.
+        sources = lose_edges(arrays["offsets"], arrays["targets"],
+                             vertices, sources, start, alive, in_degree)
+        sinks = lose_edges(arrays["reverse_offsets"],
+                           arrays["reverse_targets"], vertices, sinks,
+                           start, alive, out_degree)
+        sinks = sinks[in_degree[sinks] != 0]
+
+    core = np.flatnonzero(alive)
+    # The literal with the most paths through it is the likeliest to sit
+    # in a large component.
+    pivot = None
+    if len(core):
+        pivot = int(vertices[core[np.argmax(in_degree[core] *
+                                            out_degree[core])]])
+    order = np.concatenate(front + [core] + back[::-1])
+    vertices = vertices[order]
+    arrays["vertices"][start:end] = vertices
+    arrays["slot"][vertices] = np.arange(start, end)
+    core_start = start + sum(map(len, front))
+    core_end = core_start + len(core)
+    finished = np.concatenate((np.arange(start, core_start),
+                               np.arange(core_end, end)))
+    arrays["component"][arrays["vertices"][finished]] = finished
+
+    if core_end - core_start <= SEQUENTIAL_LITERALS:
+        return removed, solve_range(core_start, core_end), None
+    arrays["forward"][pivot] = arrays["backward"][pivot] = 1
+    return removed, 0, (core_start, core_end, pivot)
+
+
+def lose_edges(offsets: np.ndarray, targets: np.ndarray,
+               vertices: np.ndarray, removed: np.ndarray, start: int,
+               alive: np.ndarray, degree: np.ndarray) -> np.ndarray:
+    # Takes the edges of the removed literals off the degree of their
+    # neighbours; returns the neighbours left with none.
+    neighbours = local_edges(offsets, targets, vertices[removed], start)[1]
+    neighbours = neighbours[alive[neighbours]]
+    np.subtract.at(degree, neighbours, 1)
+    return distinct(neighbours[degree[neighbours] == 0])
+
+
+def distinct(values: np.ndarray) -> np.ndarray:
+    # Every value once, without sorting: only the last position each
+    # value is written from survives.
+    positions = np.arange(len(values), dtype=np.int32)
+    scratch[values] = positions
+    return values[scratch[values] == positions]
+
+
+def expand(start: int, end: int, frontier: np.ndarray, forward: bool,
+           narrow_budget: int, alone: bool):
+    # Marks the literals of the range one level past the frontier, along
+    # the edges or against them, and returns them with the number of
+    # narrow levels. A job given the whole frontier goes on while it
+    # stays too small to share, up to narrow_budget narrow levels.
+    if forward:
+        offsets, targets = arrays["offsets"], arrays["targets"]
+        mark = arrays["forward"]
+    else:
+        offsets = arrays["reverse_offsets"]
+        targets = arrays["reverse_targets"]
+        mark = arrays["backward"]
+    slot = arrays["slot"]
+    narrow_levels = 0
+    while True:
+        neighbours = out_edges(offsets, targets, frontier)[1]
+        neighbours = neighbours[(slot[neighbours] >= start) &
+                                (slot[neighbours] < end)]
+        frontier = distinct(neighbours[mark[neighbours] == 0])
+        mark[frontier] = 1
+        if not alone:
+            return frontier, 0
+        if len(frontier) < NARROW_FRONTIER:
+            narrow_levels += 1
+        if not len(frontier) or len(frontier) >= 2 * CHUNK_FRONTIER or \
+                narrow_levels > narrow_budget:
+            return frontier, narrow_levels
+
+
+def split_range(start: int, end: int) -> list:
+    # Reorders the range by the marks of its pivot, finishes the pivot's
+    # component and returns the ranges of the other three parts.
+    vertices = arrays["vertices"][start:end]
+    forward = arrays["forward"][vertices]
+    backward = arrays["backward"][vertices]
+    # 0: reaches the pivot only, 1: its component, 2: neither, 3: reached.
+    part = np.where(backward, forward, 2 + forward)
+    order = np.argsort(part, kind='stable')
+    vertices = vertices[order]
+    arrays["vertices"][start:end] = vertices
+    arrays["slot"][vertices] = np.arange(start, end)
+    arrays["forward"][vertices] = 0
+    arrays["backward"][vertices] = 0
+
+    bounds = (start + np.concatenate(
+        ([0], np.cumsum(np.bincount(part, minlength=4))))).tolist()
+    arrays["component"][arrays["vertices"][bounds[1]:bounds[2]]] = bounds[1]
+    parts = []
+    for part_start, part_end in zip(bounds[:-1], bounds[1:]):
+        if part_start == bounds[1] or part_end == part_start:
+            continue
+        if part_end - part_start == 1:
+            arrays["component"][arrays["vertices"][part_start]] = part_start
+        else:
+            parts.append((part_start, part_end))
+    return parts
+
+
+def solve_range(start: int, end: int) -> int:
+    # Finishes the range with Tarjan over the edges inside it. Returns
+    # the number of literals.
+    vertices = arrays["vertices"][start:end].copy()
+    count = end - start
+    sources, targets = local_edges(arrays["offsets"], arrays["targets"],
+                                   vertices, start)
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=count), out=offsets[1:])
+    # The nodes of the range are renumbered, so they are not literal
+    # pairs; find_components checks the whole result for conflicts.
+    order = array('i', bytes(4 * count))
+    component = program.tarjan_scc(array('q', offsets.tobytes()),
+                                   array('i', targets.astype(np.int32)
+                                         .tobytes()), count, paired=False,
+                                   order=order)
+
+    order = np.frombuffer(order, dtype=np.int32)
+    vertices = vertices[order]
+    arrays["vertices"][start:end] = vertices
+    arrays["slot"][vertices] = np.arange(start, end)
+    arrays["component"][vertices] = start + \
+        np.frombuffer(component, dtype=np.int32)[order]
+    arrays["forward"][vertices] = 0
+    arrays["backward"][vertices] = 0
+    return count
@@ -1,175 +1,1319 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import os
 import sys
+from array import array
+from collections import deque
+from itertools import repeat
 
-import pandas as pd
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
+import graph_format
+import instrumentation
+import result_cache
+import result_format
+from instrumentation import NO_METRICS
+from lazy_import import lazy_import
 
-class Statement:
-    node_name: str
-    node_color: str
-    target_color: str
+# Imported on first use: small inputs are read, solved and written with
+# the standard library alone, which starts several times faster.
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+parallel_scc = lazy_import('parallel_scc')
 
-    opposite = None
+COLORS = ["red", "green", "blue"]
+COLOR_CODES = {color: code for code, color in enumerate(COLORS)}
 
-    out_edges: list
-    in_edges: list
+# Literal 2 * vertex means "vertex takes its first possible color",
+# literal 2 * vertex + 1 ("opposite") - "vertex takes the second one".
+POSSIBLE_COLORS = [[other for other in range(len(COLORS)) if other != color]
+                   for color in range(len(COLORS))]
 
-    tout: int = None
-    component: int = None
+# Index of a color among POSSIBLE_COLORS of a vertex with the given old one.
+COLOR_POSITION = [[POSSIBLE_COLORS[color].index(other)
+                   if other != color else -1
+                   for other in range(len(COLORS))]
+                  for color in range(len(COLORS))]
+NAME_RANK = [sorted(COLORS).index(color) for color in COLORS]
 
-    def __init__(self, node_name: str, target_color: str, node_color: str):
-        self.target_color = target_color
-        self.node_name = node_name
-        self.node_color = node_color
-        self.out_edges = []
-        self.in_edges = []
+SOLVERS = ("kosaraju", "tarjan", "parallel")
 
+# Files up to this size, in bytes, and graphs up to this many implication
+# edges are handled without NumPy and pandas: below it their import takes
+# longer than the solve.
+SMALL_INPUT = 1 << 20
+SMALL_GRAPH_EDGES = 1 << 18
 
-def main():
-    statements = []
-    node_names = {}
+# Values pandas.read_csv turns into NaN or booleans. A name column with
+# any of them is left to pandas, so both readers agree on the names.
+NA_VALUES = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN',
+                       '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+                       'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+BOOLEAN_VALUES = frozenset(['True', 'TRUE', 'true', 'False', 'FALSE',
+                            'false'])
 
-    for name1, name2, color1, color2 in read_file("graph.csv"):
-        add_node_if_new(name1, color1, node_names, statements)
-        add_node_if_new(name2, color2, node_names, statements)
-        set_statements_links(name1, name2, node_names)
+NOT_VISITED = -2
+IN_PROGRESS = -1
+# Component of the nodes of a component tarjan_scc is closing.
+CLOSING = -2
 
-    fill_out_times(statements)
-    statements.sort(key=lambda x: x.tout, reverse=True)
-    setup_components(statements)
-    select_colors(statements)
+# Reduction.literal_map of the literals the preprocessing fixed.
+FORCED_TRUE = -1
+FORCED_FALSE = -2
 
-    write_to_file(node_names)
 
+class ImplicationGraph:
+    # Out edges of every literal in CSR form. Graphs made by from_edges
+    # hold every implication once, targets in increasing order, and no
+    # self-loops; the numbers of edges dropped are kept.
+    __slots__ = ('literal_count', 'offsets', 'targets', 'duplicate_edges',
+                 'self_loops')
 
-def read_file(path: str):
-    df: pd.DataFrame = pd.read_csv(path, header=0)
-    for idx, row in df.iterrows():
-        yield row['vertex1'], row['vertex2'], row['color1'], row['color2']
+    literal_count: int
 
+    offsets: array
+    targets: array
 
-def add_node_if_new(name: str, color: str, node_names: dict, statements: list):
-    if name not in node_names:
-        possible_colors: list = ["red", "green", "blue"]
-        possible_colors.remove(color)
+    duplicate_edges: int
+    self_loops: int
 
-        positive = Statement(name, possible_colors[0], color)
-        negative = Statement(name, possible_colors[1], color)
+    def __init__(self, literal_count: int, offsets: array, targets: array,
+                 duplicate_edges: int = 0, self_loops: int = 0):
+        self.literal_count = literal_count
+        self.offsets = offsets
+        self.targets = targets
+        self.duplicate_edges = duplicate_edges
+        self.self_loops = self_loops
 
-        negative.opposite = positive
-        positive.opposite = negative
+    @classmethod
+    def from_edges(cls, literal_count: int, sources, targets):
+        if isinstance(sources, array):
+            if len(sources) <= SMALL_GRAPH_EDGES:
+                return cls(literal_count,
+                           *build_csr(literal_count, sources, targets))
+            sources = np.frombuffer(sources, dtype=np.int32)
+            targets = np.frombuffer(targets, dtype=np.int32)
+        return cls(literal_count,
+                   *build_csr_vectorized(literal_count, sources, targets))
 
-        statements.append(positive)
-        statements.append(negative)
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
 
-        node_names[name] = positive
+    def out_edges(self, literal: int) -> array:
+        return self.targets[self.offsets[literal]:self.offsets[literal + 1]]
 
+    def reversed(self) -> 'ImplicationGraph':
+        if self.edge_count <= SMALL_GRAPH_EDGES:
+            return ImplicationGraph(self.literal_count, *reverse_csr(
+                self.literal_count, self.offsets, self.targets))
+        sources = np.repeat(
+            np.arange(self.literal_count, dtype=np.int32),
+            np.diff(np.frombuffer(self.offsets, dtype=np.int64)))
+        return ImplicationGraph.from_edges(
+            self.literal_count, np.frombuffer(self.targets, dtype=np.int32),
+            sources)
 
-def set_statements_links(name1: str, name2: str, node_names: dict):
-    first_p: Statement = node_names[name1]
-    first_n: Statement = node_names[name1].opposite
-    second_p: Statement = node_names[name2]
-    second_n: Statement = node_names[name2].opposite
-    current_statements = [first_p, first_n, second_p, second_n]
 
-    if first_p.node_color == second_p.node_color:
-        set_equal_colors(current_statements)
-    else:
-        set_different_colors(current_statements)
+class UnsatisfiableError(Exception):
+    vertex: int
+
+    def __init__(self, vertex: int):
+        super().__init__(f'Vertex {vertex} can not be recolored: both of its '
+                         f'possible colors are in one component')
+        self.vertex = vertex
+
+
+class Result:
+    __slots__ = ('satisfiable', 'colors', 'conflict')
+
+    satisfiable: bool
+    colors: dict
+    conflict: object
+
+    def __init__(self, colors: dict = None, conflict=None):
+        self.satisfiable = colors is not None
+        self.colors = colors
+        self.conflict = conflict
+
+    def __repr__(self):
+        if self.satisfiable:
+            return f'Result(colors={self.colors!r})'
+        return f'Result(satisfiable=False, conflict={self.conflict!r})'
+
+
+class Reduction:
+    # A graph with its equivalent literals contracted and its forced
+    # literals fixed. literal_map gives the residual literal of every
+    # literal of the graph, or FORCED_TRUE / FORCED_FALSE. Residual
+    # literals are paired like any others, so the residual graph is
+    # solved as it is, and residual_vertices names a vertex of the graph
+    # for every residual vertex.
+    literal_map: np.ndarray
+    residual: ImplicationGraph
+    residual_vertices: np.ndarray
+
+    equivalent_literals: int
+    forced_vertices: int
+
+    def __init__(self, literal_map: np.ndarray, residual: ImplicationGraph,
+                 residual_vertices: np.ndarray, equivalent_literals: int):
+        self.literal_map = literal_map
+        self.residual = residual
+        self.residual_vertices = residual_vertices
+        self.equivalent_literals = equivalent_literals
+        self.forced_vertices = int(np.count_nonzero(literal_map[0::2] < 0))
+
+    def expand(self, component: array, node_colors: array) -> array:
+        # New colors of the graph from the components of the residual
+        # graph, picked by the same rule as select_colors.
+        component = np.frombuffer(component, dtype=np.int32)
+        holds = component > component[np.arange(len(component)) ^ 1]
+        second = self.literal_map[1::2]
+        second_holds = second == FORCED_TRUE
+        mapped = second >= 0
+        second_holds[mapped] = holds[second[mapped]]
+        possible = np.array(POSSIBLE_COLORS, dtype=np.int8)
+        return to_array('b', possible[np.frombuffer(node_colors, np.int8),
+                                      second_holds.astype(np.intp)])
+
+
+class StreamingGraphBuilder:
+    # Vertex names are interned to dense int32 ids in the order of first
+    # appearance, as in build_graph, and colors to their codes. Past this
+    # point everything works on ids; names are only needed for the output.
+    name_chunks: list
+    vertex_ids: dict = None
+    node_colors: array
+
+    sources: array
+    targets: array
+
+    def __init__(self):
+        self.name_chunks = []
+        self.node_colors = array('b')
+        self.sources = array('i')
+        self.targets = array('i')
+
+    def node_names(self) -> np.ndarray:
+        # Name of every vertex id.
+        if len(self.name_chunks) != 1:
+            self.name_chunks = [np.concatenate(self.name_chunks)
+                                if self.name_chunks else np.empty(0, object)]
+        return self.name_chunks[0]
+
+    def add_columns(self, names1, names2, colors1, colors2):
+        first, second = self.intern_columns(names1, names2, colors1, colors2)
+        sources, targets = link_statements_vectorized(
+            first, second, np.frombuffer(self.node_colors, dtype=np.int8))
+        self.sources.frombytes(sources.tobytes())
+        self.targets.frombytes(targets.tobytes())
 
+    def intern_columns(self, names1, names2, colors1, colors2):
+        # factorize numbers the names of a chunk in the order of their first
+        # appearance, so for the first chunk they already are the ids.
+        vertices, names = pd.factorize(
+            np.column_stack((names1, names2)).ravel())
+        colors = np.column_stack((encode_colors(colors1),
+                                  encode_colors(colors2))).ravel()
+        seen = np.maximum.accumulate(vertices)
+        first_seen = np.flatnonzero(np.diff(seen, prepend=-1) > 0)
 
-def set_equal_colors(current_statements: list):
-    first_color = current_statements[0].target_color
-    first_color_statements = []
-    second_color_statements = []
-    for statement in current_statements:
-        if statement.target_color == first_color:
-            first_color_statements.append(statement)
+        vertex_count = len(self.node_colors)
+        if vertex_count == 0:
+            new = first_seen
+            vertices = vertices.astype(np.int32)
         else:
-            second_color_statements.append(statement)
+            # Later chunks look their names up in a dict built once.
+            if self.vertex_ids is None:
+                self.vertex_ids = dict(zip(self.node_names().tolist(),
+                                           range(vertex_count)))
+            ids = np.fromiter(map(self.vertex_ids.get, names.tolist(),
+                                  repeat(-1)), dtype=np.int32,
+                              count=len(names))
+            new_ids = np.flatnonzero(ids < 0)
+            ids[new_ids] = np.arange(vertex_count,
+                                     vertex_count + len(new_ids))
+            names = names[new_ids]
+            self.vertex_ids.update(zip(names.tolist(), ids[new_ids].tolist()))
+            new = first_seen[new_ids]
+            vertices = ids[vertices]
+        self.name_chunks.append(names)
+        self.node_colors.frombytes(colors[new].tobytes())
+        return vertices[0::2], vertices[1::2]
+
+    def build(self):
+        literal_count = 2 * len(self.node_colors)
+        graph = ImplicationGraph.from_edges(
+            literal_count, np.frombuffer(self.sources, dtype=np.int32),
+            np.frombuffer(self.targets, dtype=np.int32))
+        self.sources = array('i')
+        self.targets = array('i')
+        return self.node_names(), self.node_colors, graph
+
+
+def build_csr(literal_count: int, sources: array, targets: array):
+    # Edges are packed into source * literal_count + target keys and
+    # deduplicated in a set; the sorted keys give the same CSR as
+    # build_csr_vectorized. Also returns the numbers of duplicate edges
+    # and self-loops dropped.
+    keys = set()
+    self_loops = 0
+    for source, target in zip(sources, targets):
+        if source == target:
+            self_loops += 1
+        else:
+            keys.add(source * literal_count + target)
+    keys = sorted(keys)
+
+    offsets = array('q', bytes(8 * (literal_count + 1)))
+    edges = array('i', bytes(4 * len(keys)))
+    for position, key in enumerate(keys):
+        source, edges[position] = divmod(key, literal_count)
+        offsets[source + 1] += 1
+    for literal in range(literal_count):
+        offsets[literal + 1] += offsets[literal]
+    return offsets, edges, len(sources) - self_loops - len(keys), self_loops
+
+
+def reverse_csr(literal_count: int, offsets: array, targets: array):
+    # Counting sort of the edges by target. Sources are visited in
+    # increasing order, so the reversed graph is as canonical as the graph.
+    reverse_offsets = array('q', bytes(8 * (literal_count + 1)))
+    for target in targets:
+        reverse_offsets[target + 1] += 1
+    for literal in range(literal_count):
+        reverse_offsets[literal + 1] += reverse_offsets[literal]
+    positions = reverse_offsets[:-1]
+    sources = array('i', bytes(4 * len(targets)))
+    for source in range(literal_count):
+        for idx in range(offsets[source], offsets[source + 1]):
+            target = targets[idx]
+            sources[positions[target]] = source
+            positions[target] += 1
+    return reverse_offsets, sources
+
+
+def build_csr_vectorized(literal_count: int, sources: np.ndarray,
+                         targets: np.ndarray):
+    # Same as build_csr with a sort over the packed keys, which is also
+    # several times faster than a stable argsort by source.
+    loops = sources == targets
+    self_loops = int(np.count_nonzero(loops))
+    if self_loops:
+        sources = sources[~loops]
+        targets = targets[~loops]
+    keys = sources.astype(np.int64) * literal_count + targets
+    keys.sort()
+    unique = np.empty(len(keys), dtype=bool)
+    unique[:1] = True
+    np.not_equal(keys[1:], keys[:-1], out=unique[1:])
+    keys = keys[unique]
+
+    edge_sources, edges = np.divmod(keys, literal_count)
+    offsets = np.zeros(literal_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_sources, minlength=literal_count),
+              out=offsets[1:])
+    return (to_array('q', offsets), to_array('i', edges),
+            len(unique) - len(keys), self_loops)
+
+
+def to_array(typecode: str, values: np.ndarray) -> array:
+    result = array(typecode)
+    result.frombytes(values.astype(typecode, copy=False).tobytes())
+    return result
+
+
+def main(solver: str = "kosaraju", chunksize: int = None,
+         path: str = "graph.csv",
+         metrics: instrumentation.Metrics = NO_METRICS,
+         output_path: str = "output_file.txt", output_format: str = "text",
+         preprocess: bool = False, cache: result_cache.ResultCache = None):
+    metrics.start()
+    try:
+        if cache is None:
+            node_names, node_colors, graph = load_graph(path, chunksize,
+                                                        metrics)
+            new_colors, cycle = solve_loaded(graph, node_colors, solver,
+                                             preprocess, metrics)
+        else:
+            node_names, new_colors, cycle = solve_cached(
+                path, chunksize, cache, solver, preprocess, metrics)
+        metrics.count("satisfiable", cycle is None)
+        if cycle is not None:
+            print("Iit is impossible to color this graph")
+            print(explain_conflict(path, cycle, chunksize), file=sys.stderr)
+            sys.exit()
+
+        with metrics.stage("output"):
+            write_to_file(node_names, new_colors, output_path, output_format)
+        if chunksize is not None:
+            print(f'Peak RSS: {peak_rss_mb():.1f} MiB', file=sys.stderr)
+    finally:
+        if resource is not None:
+            metrics.count("peak_rss_mb", peak_rss_mb())
+        metrics.finish()
+
+
+def solve_loaded(graph: ImplicationGraph, node_colors: array, solver: str,
+                 preprocess: bool = False,
+                 metrics: instrumentation.Metrics = NO_METRICS):
+    # The new colors, or the conflict cycle when there are none.
+    metrics.count("vertices", len(node_colors))
+    metrics.count("literals", graph.literal_count)
+    metrics.count("implication_edges", graph.edge_count)
+    metrics.count("duplicate_implication_edges", graph.duplicate_edges)
+    metrics.count("implication_self_loops", graph.self_loops)
+    try:
+        if preprocess:
+            return solve_reduced(graph, node_colors, solver, metrics), None
+        component = find_components(graph, solver, metrics)
+        with metrics.stage("assignment"):
+            return select_colors(component, node_colors), None
+    except UnsatisfiableError as error:
+        return None, conflict_cycle(graph, error.vertex)
 
-    add_link(first_color_statements[0], first_color_statements[1])
-    add_link(second_color_statements[0], second_color_statements[1])
+
+def solve_cached(path: str, chunksize: int, cache: result_cache.ResultCache,
+                 solver: str, preprocess: bool = False,
+                 metrics: instrumentation.Metrics = NO_METRICS):
+    # Same as load_graph and solve_loaded, except that a graph found in
+    # the cache by its canonical key is answered without building its
+    # implication graph.
+    node_names, node_colors, first, second = read_endpoints(path, chunksize,
+                                                            metrics)
+    with metrics.stage("cache lookup"):
+        key, rank = result_cache.canonical_key(node_names, node_colors,
+                                               first, second)
+        cached = cache.get(key)
+    if cached is not None:
+        new_colors = cycle = None
+        if cached.cycle is not None:
+            cycle = result_cache.cycle_from_canonical(cached.cycle, rank)
+        else:
+            new_colors = result_cache.from_canonical(cached.colors, rank)
+    else:
+        with metrics.stage("graph build"):
+            graph = link_endpoints(node_colors, first, second)
+        new_colors, cycle = solve_loaded(graph, node_colors, solver,
+                                         preprocess, metrics)
+        with metrics.stage("cache store"):
+            if cycle is not None:
+                cache.put(key, result_cache.CachedResult(
+                    cycle=result_cache.cycle_to_canonical(cycle, rank)))
+            else:
+                cache.put(key, result_cache.CachedResult(
+                    result_cache.to_canonical(new_colors, rank)))
+    for name, value in cache.counters().items():
+        metrics.count(name, value)
+    return node_names, new_colors, cycle
 
 
-def set_different_colors(current_statements: list):
-    current_statements.sort(key=lambda x: x.target_color)
+def load_graph(path: str, chunksize: int = None,
+               metrics: instrumentation.Metrics = NO_METRICS):
+    if chunksize is None and os.path.getsize(path) <= SMALL_INPUT:
+        graph = load_small_graph(path, metrics)
+        if graph is not None:
+            return graph
+    if graph_format.is_binary(path):
+        return build_graph_from_binary(path, metrics)
+    if chunksize is None:
+        with metrics.stage("ingest"):
+            columns = read_columns(path)
+        with metrics.stage("graph build"):
+            return build_graph_from_columns(*columns)
 
-    for idx in range(1, 4):
-        if current_statements[idx].target_color == \
-                current_statements[idx - 1].target_color:
-            del current_statements[idx - 1:idx + 1]
+    builder = StreamingGraphBuilder()
+    chunks = read_chunks(path, chunksize)
+    while True:
+        with metrics.stage("ingest"):
+            columns = next(chunks, None)
+        if columns is None:
             break
+        with metrics.stage("graph build"):
+            builder.add_columns(*columns)
+    with metrics.stage("graph build"):
+        return builder.build()
+
+
+def load_small_graph(path: str,
+                     metrics: instrumentation.Metrics = NO_METRICS):
+    # Standard library only. None when the CSV needs pandas to type its
+    # names.
+    with metrics.stage("ingest"):
+        if graph_format.is_binary(path):
+            node_names, node_colors, first, second = \
+                graph_format.read_graph_arrays(path)
+        else:
+            columns = read_columns_stdlib(path)
+            if columns is None:
+                return None
+            node_names, node_colors, first, second = intern_rows(
+                zip(*columns))
+    with metrics.stage("graph build"):
+        return node_names, node_colors, link_endpoints(node_colors, first,
+                                                       second)
+
+
+def read_endpoints(path: str, chunksize: int = None,
+                   metrics: instrumentation.Metrics = NO_METRICS):
+    # Interned names, color codes and edge endpoints as load_graph reads
+    # them: stdlib arrays for small files, NumPy arrays otherwise.
+    with metrics.stage("ingest"):
+        if chunksize is None and os.path.getsize(path) <= SMALL_INPUT:
+            if graph_format.is_binary(path):
+                return graph_format.read_graph_arrays(path)
+            columns = read_columns_stdlib(path)
+            if columns is not None:
+                return intern_rows(zip(*columns))
+        if chunksize is None or graph_format.is_binary(path):
+            node_names, colors, first, second = load_endpoints(path)
+            return node_names, to_array('b', colors), first, second
+
+        builder = StreamingGraphBuilder()
+        first = array('i')
+        second = array('i')
+        for columns in read_chunks(path, chunksize):
+            chunk_first, chunk_second = builder.intern_columns(*columns)
+            first.frombytes(chunk_first.tobytes())
+            second.frombytes(chunk_second.tobytes())
+        return (builder.node_names(), builder.node_colors,
+                np.frombuffer(first, dtype=np.int32),
+                np.frombuffer(second, dtype=np.int32))
+
+
+def link_endpoints(node_colors: array, first, second) -> ImplicationGraph:
+    if hasattr(first, 'dtype'):
+        sources, targets = link_statements_vectorized(
+            first, second, np.frombuffer(node_colors, dtype=np.int8))
+    else:
+        sources = array('i')
+        targets = array('i')
+        for edge in range(len(first)):
+            set_statements_links(first[edge], second[edge], node_colors,
+                                 sources, targets)
+    return ImplicationGraph.from_edges(2 * len(node_colors), sources,
+                                       targets)
+
+
+def solve(edges, colors, solver: str = "tarjan") -> Result:
+    return solve_graph(*build_graph_from_pairs(edges, colors), solver)
+
+
+def solve_graph(node_names, node_colors: array,
+                graph: ImplicationGraph, solver: str = "tarjan") -> Result:
+    try:
+        new_colors = select_colors(find_components(graph, solver),
+                                   node_colors)
+    except UnsatisfiableError as error:
+        return Result(conflict=restore_names(node_names)[error.vertex])
+    return Result({name: COLORS[color] for name, color
+                   in zip(restore_names(node_names), new_colors)})
+
+
+def restore_names(node_names) -> list:
+    # Vertex names as the Python values they were read as.
+    if hasattr(node_names, 'dtype'):
+        return node_names.tolist()
+    return list(node_names)
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak / 1024 ** (2 if sys.platform == 'darwin' else 1)
+
+
+def build_graph(rows):
+    # Rows only go through interning here; their implication edges are
+    # added at once from the endpoint ids.
+    node_names, node_colors, first, second = intern_rows(rows)
+    sources, targets = link_statements_vectorized(
+        np.frombuffer(first, dtype=np.int32),
+        np.frombuffer(second, dtype=np.int32),
+        np.frombuffer(node_colors, dtype=np.int8))
+    graph = ImplicationGraph.from_edges(2 * len(node_colors), sources,
+                                        targets)
+    return node_names, node_colors, graph
+
+
+def intern_rows(rows):
+    # Vertex names, in the order of first appearance, their color codes
+    # and the endpoint ids of every row.
+    node_names = {}
+    node_colors = array('b')
+    first = array('i')
+    second = array('i')
+    for name1, name2, color1, color2 in rows:
+        first.append(add_node_if_new(name1, color1, node_names, node_colors))
+        second.append(add_node_if_new(name2, color2, node_names,
+                                      node_colors))
+    return list(node_names), node_colors, first, second
+
+
+def build_graph_from_pairs(edges, colors):
+    return build_graph_from_columns(*pairs_to_columns(edges, colors))
+
+
+def pairs_to_columns(edges, colors):
+    # edges are pairs of vertex names (an iterable or an (m, 2) array),
+    # colors maps every name to its current color: a dict, or a sequence
+    # when the names are integer ids.
+    if not isinstance(edges, np.ndarray):
+        edges = np.array(list(edges), dtype=object)
+    edges = edges.reshape(-1, 2)
+    vertices, names = pd.factorize(edges.ravel())
+    edge_colors = np.array([colors[name] for name in names.tolist()],
+                           dtype=object)[vertices].reshape(-1, 2)
+
+    return edges[:, 0], edges[:, 1], edge_colors[:, 0], edge_colors[:, 1]
+
+
+def build_graph_from_binary(path: str,
+                            metrics: instrumentation.Metrics = NO_METRICS):
+    with metrics.stage("ingest"):
+        node_names, colors, first, second = load_endpoints(path)
+    with metrics.stage("graph build"):
+        sources, targets = link_statements_vectorized(first, second, colors)
+        graph = ImplicationGraph.from_edges(2 * len(colors), sources,
+                                            targets)
+        return node_names, to_array('b', colors), graph
+
+
+def load_endpoints(path: str):
+    # Interned vertex names, int8 vertex colors and the int32 endpoints of
+    # every input edge, without building the implication graph.
+    if graph_format.is_binary(path):
+        return graph_format.read_graph(path)
+
+    builder = StreamingGraphBuilder()
+    first, second = builder.intern_columns(*read_columns(path))
+    return (builder.node_names(), np.frombuffer(builder.node_colors, np.int8),
+            first, second)
+
+
+def connected_components(first: np.ndarray, second: np.ndarray,
+                         vertex_count: int) -> np.ndarray:
+    # Union-find over vertex ids done for all edges at once: every root is
+    # hooked under the smallest root it shares an edge with, then paths are
+    # compressed by pointer jumping, until no edge joins two roots.
+    parent = np.arange(vertex_count, dtype=np.int32)
+    while True:
+        first_root = parent[first]
+        second_root = parent[second]
+        joins = first_root != second_root
+        if not joins.any():
+            return parent
+        np.minimum.at(parent, np.maximum(first_root, second_root)[joins],
+                      np.minimum(first_root, second_root)[joins])
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+
+
+def convert_to_binary(csv_path: str, binary_path: str,
+                      chunksize: int = 1_000_000):
+    builder = StreamingGraphBuilder()
+    first = array('i')
+    second = array('i')
+    for columns in read_chunks(csv_path, chunksize):
+        chunk_first, chunk_second = builder.intern_columns(*columns)
+        first.frombytes(chunk_first.tobytes())
+        second.frombytes(chunk_second.tobytes())
+    graph_format.write_graph(binary_path, builder.node_names(),
+                             builder.node_colors, first, second)
 
-    add_link(current_statements[0], current_statements[1])
 
+def build_graph_from_columns(names1, names2, colors1, colors2):
+    builder = StreamingGraphBuilder()
+    builder.add_columns(names1, names2, colors1, colors2)
+    return builder.build()
 
-def add_link(st_a: Statement, st_b: Statement):
-    add_edge(st_a.opposite, st_b)
-    add_edge(st_b.opposite, st_a)
 
+def encode_colors(colors) -> np.ndarray:
+    codes = pd.Categorical(colors, categories=COLORS).codes
+    if (codes < 0).any():
+        unknown = np.asarray(colors)[codes < 0][0]
+        raise ValueError(f'Unknown color: {unknown}')
+    return codes.astype(np.int8)
 
-def add_edge(st_a: Statement, st_b: Statement):
-    st_a.out_edges.append(st_b)
-    st_b.in_edges.append(st_a)
 
+def link_statements_vectorized(first: np.ndarray, second: np.ndarray,
+                               vertex_colors: np.ndarray):
+    # Same implication edges, in the same order, as set_statements_links
+    # called row by row: four per equal-colored pair, two otherwise.
+    first_color = vertex_colors[first]
+    second_color = vertex_colors[second]
+    equal = first_color == second_color
 
-def fill_out_times(statements: list):
+    counts = np.where(equal, 4, 2)
+    starts = np.cumsum(counts) - counts
+    sources = np.empty(int(counts.sum()), dtype=np.int32)
+    targets = np.empty_like(sources)
+
+    rows = np.flatnonzero(equal)
+    start = starts[rows]
+    positive_a = 2 * first[rows]
+    positive_b = 2 * second[rows]
+    add_links_vectorized(positive_a, positive_b, start, sources, targets)
+    add_links_vectorized(positive_a + 1, positive_b + 1, start + 2,
+                         sources, targets)
+
+    rows = np.flatnonzero(~equal)
+    first_color = first_color[rows]
+    second_color = second_color[rows]
+    color_position = np.array(COLOR_POSITION, dtype=np.int32)
+    name_rank = np.array(NAME_RANK)
+    first_literal = 2 * first[rows] + color_position[first_color,
+                                                     second_color]
+    second_literal = 2 * second[rows] + color_position[second_color,
+                                                       first_color]
+    first_goes_first = name_rank[second_color] < name_rank[first_color]
+    add_links_vectorized(
+        np.where(first_goes_first, first_literal, second_literal),
+        np.where(first_goes_first, second_literal, first_literal),
+        starts[rows], sources, targets)
+    return sources, targets
+
+
+def add_links_vectorized(st_a: np.ndarray, st_b: np.ndarray,
+                         start: np.ndarray, sources: np.ndarray,
+                         targets: np.ndarray):
+    sources[start] = st_a ^ 1
+    targets[start] = st_b
+    sources[start + 1] = st_b ^ 1
+    targets[start + 1] = st_a
+
+
+def read_columns(path: str):
+    return get_columns(pd.read_csv(path, header=0))
+
+
+def read_columns_stdlib(path: str):
+    # The four columns of a CSV graph with the csv module, names typed the
+    # way pandas.read_csv types them: a column of integers is read as
+    # ints, one of other text as str. None when pandas would read a name
+    # column differently (floats, booleans, missing values) or the file
+    # does not have the graph.csv shape, so the caller falls back to it.
+    with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None or len(set(header)) != len(header):
+            return None
+        try:
+            indices = [header.index(name) for name in
+                       ('vertex1', 'vertex2', 'color1', 'color2')]
+        except ValueError:
+            return None
+        rows = [row for row in reader if row]
+    if any(len(row) != len(header) for row in rows):
+        return None
+
+    columns = [[row[index] for row in rows] for index in indices]
+    for position in (0, 1):
+        names = typed_names(columns[position])
+        if names is None:
+            return None
+        columns[position] = names
+    for position in (2, 3):
+        unknown = set(columns[position]).difference(COLOR_CODES)
+        if unknown:
+            raise ValueError(f'Unknown color: {min(unknown)}')
+    return columns
+
+
+def typed_names(column: list):
+    values = set(column)
+    if values & NA_VALUES or values and values <= BOOLEAN_VALUES:
+        return None
+    if all(is_integer(value) for value in values):
+        names = [int(value) for value in column]
+        if values and not -2 ** 63 <= min(names) <= max(names) < 2 ** 63:
+            return None
+        return names
+    try:
+        for value in values:
+            float(value)
+    except ValueError:
+        return column
+    return None
+
+
+def is_integer(value: str) -> bool:
+    digits = value[1:] if value[0] in '+-' else value
+    return digits.isascii() and digits.isdigit()
+
+
+def read_chunks(path: str, chunksize: int):
+    for df in pd.read_csv(path, header=0, chunksize=chunksize):
+        yield get_columns(df)
+
+
+def get_columns(df: pd.DataFrame):
+    return (df['vertex1'].to_numpy(), df['vertex2'].to_numpy(),
+            df['color1'].to_numpy(), df['color2'].to_numpy())
+
+
+def add_node_if_new(name, color: str, node_names: dict,
+                    node_colors: array) -> int:
+    vertex = node_names.get(name)
+    if vertex is None:
+        vertex = len(node_colors)
+        node_names[name] = vertex
+        node_colors.append(COLOR_CODES[color])
+    return vertex
+
+
+def set_statements_links(first: int, second: int, node_colors: array,
+                         sources: array, targets: array):
+    first_literal = 2 * first
+    second_literal = 2 * second
+    literals = (first_literal, first_literal + 1,
+                second_literal, second_literal + 1)
+    for source, target in STATEMENT_LINKS[node_colors[first]][
+            node_colors[second]]:
+        sources.append(literals[source])
+        targets.append(literals[target])
+
+
+# The links below are written over the four literals of an input edge:
+# 0 and 1 are the literals of its first vertex, 2 and 3 of the second.
+def equal_color_links() -> tuple:
+    return add_link(0, 2) + add_link(1, 3)
+
+
+def different_color_links(first_color: int, second_color: int) -> tuple:
+    # The only forbidden pair is both vertices taking the third color, so
+    # at least one of them must take the old color of the other one.
+    first_literal = POSSIBLE_COLORS[first_color].index(second_color)
+    second_literal = 2 + POSSIBLE_COLORS[second_color].index(first_color)
+
+    if COLORS[second_color] < COLORS[first_color]:
+        return add_link(first_literal, second_literal)
+    return add_link(second_literal, first_literal)
+
+
+def add_link(st_a: int, st_b: int) -> tuple:
+    return (st_a ^ 1, st_b), (st_b ^ 1, st_a)
+
+
+# Implication edges of an input edge by the colors of its two vertices.
+STATEMENT_LINKS = [[equal_color_links() if first_color == second_color
+                    else different_color_links(first_color, second_color)
+                    for second_color in range(len(COLORS))]
+                   for first_color in range(len(COLORS))]
+
+
+def find_components(graph: ImplicationGraph, solver: str = "kosaraju",
+                    metrics: instrumentation.Metrics = NO_METRICS):
+    if solver == "kosaraju":
+        with metrics.stage("pass 1"):
+            order = order_by_out_time(fill_out_times(graph, metrics))
+        with metrics.stage("pass 2"):
+            component = setup_components(graph.reversed(), order, metrics)
+    elif solver == "tarjan":
+        with metrics.stage("pass 1"):
+            component = tarjan_components(graph, metrics)
+    elif solver == "parallel":
+        with metrics.stage("pass 1"):
+            component = parallel_scc.parallel_components(graph,
+                                                         metrics=metrics)
+        # The workers number components without pairing up literals, so
+        # conflicts are looked for once all are known.
+        pairs = np.frombuffer(component, dtype=np.int32).reshape(-1, 2)
+        conflicts = np.flatnonzero(pairs[:, 0] == pairs[:, 1])
+        if len(conflicts):
+            raise UnsatisfiableError(int(conflicts[0]))
+    else:
+        raise ValueError(f'Unknown solver: {solver}')
+    metrics.record_components(component)
+    return component
+
+
+def fill_out_times(graph: ImplicationGraph,
+                   metrics: instrumentation.Metrics = NO_METRICS) -> array:
+    tout = array('i', [NOT_VISITED]) * graph.literal_count
     cur_time = 0
-    for val in statements:
-        if val.tout is None:
-            cur_time = fill_out_times_from_node(val, cur_time)
+    max_depth = 0
+    for val in range(graph.literal_count):
+        if tout[val] == NOT_VISITED:
+            cur_time, depth = fill_out_times_from_node(graph, val, tout,
+                                                       cur_time)
+            if depth > max_depth:
+                max_depth = depth
+    metrics.maximum("dfs_max_stack_depth", max_depth)
+    return tout
 
 
-def fill_out_times_from_node(node: Statement, time: int) -> int:
-    node.tout = -1
+def fill_out_times_from_node(graph: ImplicationGraph, node: int, tout: array,
+                             time: int):
+    # Returns the next out time and the deepest the DFS stack has been.
+    offsets = graph.offsets
+    targets = graph.targets
+
+    tout[node] = IN_PROGRESS
     stack: list = [node]
+    max_depth = 1
+    # Position of the next out edge to look at for every stack frame, so
+    # that each edge is scanned once and the pass stays O(V + E).
+    cursors: list = [offsets[node]]
     while stack:
         cur_node = stack[-1]
+        idx = cursors[-1]
+        end = offsets[cur_node + 1]
 
-        for next_cur_node in cur_node.out_edges:
-            if next_cur_node.tout is None:
-                next_cur_node.tout = -1
+        while idx < end:
+            next_cur_node = targets[idx]
+            idx += 1
+            if tout[next_cur_node] == NOT_VISITED:
+                cursors[-1] = idx
+                tout[next_cur_node] = IN_PROGRESS
                 stack.append(next_cur_node)
+                cursors.append(offsets[next_cur_node])
+                if len(stack) > max_depth:
+                    max_depth = len(stack)
                 break
-
-        if stack[-1] == cur_node:
-            cur_node.tout = time
+        else:
+            tout[cur_node] = time
             time += 1
             del stack[-1]
-    return time
+            del cursors[-1]
+    return time, max_depth
+
+
+def order_by_out_time(tout: array) -> array:
+    order = array('i', bytes(4 * len(tout)))
+    last = len(tout) - 1
+    for literal, time in enumerate(tout):
+        order[last - time] = literal
+    return order
 
 
-def setup_components(statements: list):
+def setup_components(reverse_graph: ImplicationGraph, order: array,
+                     metrics: instrumentation.Metrics = NO_METRICS) -> array:
+    component = array('i', [-1]) * reverse_graph.literal_count
     cur_component = 0
-    for val in statements:
-        if val.component is None:
-            paint_graph(val, cur_component)
+    max_depth = 0
+    for val in order:
+        if component[val] == -1:
+            depth = paint_graph(reverse_graph, val, cur_component, component)
+            if depth > max_depth:
+                max_depth = depth
             cur_component += 1
+    metrics.maximum("paint_max_stack_depth", max_depth)
+    return component
 
 
-def paint_graph(node: Statement, component_number: int):
+def paint_graph(reverse_graph: ImplicationGraph, node: int,
+                component_number: int, component: array) -> int:
+    # Nodes are painted as they are pushed, so each one is pushed once and
+    # the stack never holds more than the nodes of the component. Returns
+    # the deepest the stack has been.
+    offsets = reverse_graph.offsets
+    targets = reverse_graph.targets
+    component[node] = component_number
+    if component[node ^ 1] == component_number:
+        raise UnsatisfiableError(node >> 1)
     stack: list = [node]
+    max_depth = 1
 
     while stack:
-        cur_node: Statement = stack.pop()
-        cur_node.component = component_number
-
-        for next_node in cur_node.in_edges:
-            if next_node.component is None:
+        cur_node = stack.pop()
+        for idx in range(offsets[cur_node], offsets[cur_node + 1]):
+            next_node = targets[idx]
+            if component[next_node] == -1:
+                component[next_node] = component_number
+                if component[next_node ^ 1] == component_number:
+                    raise UnsatisfiableError(next_node >> 1)
                 stack.append(next_node)
+        if len(stack) > max_depth:
+            max_depth = len(stack)
+    return max_depth
 
 
-def select_colors(statements: list):
-    for val in statements:
-        if val.component == val.opposite.component:
-            print("Iit is impossible to color this graph")
-            sys.exit()
-        if val.component > val.opposite.component:
-            val.node_color = val.target_color
-            val.opposite.node_color = val.target_color
+def tarjan_components(graph: ImplicationGraph,
+                      metrics: instrumentation.Metrics = NO_METRICS) -> array:
+    return tarjan_scc(graph.offsets, graph.targets, graph.literal_count,
+                      metrics=metrics)
+
+
+def tarjan_scc(offsets: array, targets: array, count: int,
+               paired: bool = True, order: array = None,
+               metrics: instrumentation.Metrics = NO_METRICS) -> array:
+    # Components of a CSR graph of count nodes, numbered by the position
+    # where they start in a topological order of the condensation, so the
+    # later component has the higher number. With paired, the nodes are
+    # literals and a component holding both literals of a vertex raises
+    # UnsatisfiableError. order, when given, receives the nodes in that
+    # topological order.
+    index = array('i', [-1]) * count
+    low = array('i', [0]) * count
+    component = array('i', [-1]) * count
+    # Tarjan closes components in reverse topological order, so they are
+    # placed from the end.
+    position = count
+    cur_index = 0
+    scc_stack: list = []
+    max_depth = min(1, count)
+
+    for root in range(count):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = cur_index
+        cur_index += 1
+        scc_stack.append(root)
+        stack: list = [root]
+        cursors: list = [offsets[root]]
+
+        while stack:
+            cur_node = stack[-1]
+            idx = cursors[-1]
+            end = offsets[cur_node + 1]
+
+            while idx < end:
+                next_node = targets[idx]
+                idx += 1
+                if index[next_node] == -1:
+                    cursors[-1] = idx
+                    index[next_node] = low[next_node] = cur_index
+                    cur_index += 1
+                    scc_stack.append(next_node)
+                    stack.append(next_node)
+                    cursors.append(offsets[next_node])
+                    if len(stack) > max_depth:
+                        max_depth = len(stack)
+                    break
+                if component[next_node] == -1 and \
+                        index[next_node] < low[cur_node]:
+                    low[cur_node] = index[next_node]
+            else:
+                del stack[-1]
+                del cursors[-1]
+                if low[cur_node] == index[cur_node]:
+                    member = scc_stack.pop()
+                    if member == cur_node:
+                        # Most components are single nodes.
+                        position -= 1
+                        component[member] = position
+                        if order is not None:
+                            order[position] = member
+                    else:
+                        position = close_component(
+                            scc_stack, member, cur_node, component, position,
+                            paired, order)
+                if stack and low[cur_node] < low[stack[-1]]:
+                    low[stack[-1]] = low[cur_node]
+    metrics.maximum("dfs_max_stack_depth", max_depth)
+    return component
+
+
+def close_component(scc_stack: list, member: int, cur_node: int,
+                    component: array, position: int, paired: bool,
+                    order: array) -> int:
+    # Pops the component of cur_node, whose first member was popped
+    # already, and places it before position. Returns its position.
+    members = [member]
+    component[member] = CLOSING
+    while member != cur_node:
+        member = scc_stack.pop()
+        component[member] = CLOSING
+        if paired and component[member ^ 1] == CLOSING:
+            raise UnsatisfiableError(member >> 1)
+        members.append(member)
+    position -= len(members)
+    for member in members:
+        component[member] = position
+    if order is not None:
+        order[position:position + len(members)] = array('i', members)
+    return position
+
+
+def select_colors(component: array, node_colors: array) -> array:
+    # Components are numbered in topological order of the condensation, so
+    # the literal whose component comes later is the one that holds.
+    new_colors = array('b', node_colors)
+    for vertex, color in enumerate(node_colors):
+        positive = component[2 * vertex]
+        negative = component[2 * vertex + 1]
+        if positive == negative:
+            raise UnsatisfiableError(vertex)
+        new_colors[vertex] = POSSIBLE_COLORS[color][positive < negative]
+    return new_colors
+
+
+def solve_reduced(graph: ImplicationGraph, node_colors: array,
+                  solver: str = "kosaraju",
+                  metrics: instrumentation.Metrics = NO_METRICS) -> array:
+    # New colors with the SCC passes run on the reduced graph only. They
+    # satisfy the same constraints as select_colors over the whole graph,
+    # though the two may pick different recolorings.
+    with metrics.stage("preprocess"):
+        reduction = reduce_graph(graph)
+    metrics.count("equivalent_literals", reduction.equivalent_literals)
+    metrics.count("forced_vertices", reduction.forced_vertices)
+    metrics.count("residual_literals", reduction.residual.literal_count)
+    metrics.count("residual_edges", reduction.residual.edge_count)
+    try:
+        component = find_components(reduction.residual, solver, metrics)
+    except UnsatisfiableError as error:
+        raise UnsatisfiableError(
+            int(reduction.residual_vertices[error.vertex])) from error
+    with metrics.stage("assignment"):
+        return reduction.expand(component, node_colors)
+
+
+def reduce_graph(graph: ImplicationGraph) -> Reduction:
+    # Literals joined by implications both ways are merged with
+    # connected_components, and literals implied by their own opposite in
+    # the contracted graph are fixed along with everything they imply.
+    # Edges with a fixed end are satisfied by then, so the residual graph
+    # keeps the free literals only.
+    literal_count = graph.literal_count
+    literals = np.arange(literal_count, dtype=np.int32)
+    targets = np.frombuffer(graph.targets, dtype=np.int32)
+    sources = np.repeat(literals, np.diff(np.frombuffer(graph.offsets,
+                                                        dtype=np.int64)))
+
+    keys = np.sort(sources.astype(np.int64) * literal_count + targets)
+    reverse_keys = targets.astype(np.int64) * literal_count + sources
+    mutual = np.zeros(len(keys), dtype=bool)
+    if len(keys):
+        position = np.minimum(np.searchsorted(keys, reverse_keys),
+                              len(keys) - 1)
+        mutual = keys[position] == reverse_keys
+    labels = connected_components(sources[mutual], targets[mutual],
+                                  literal_count)
+    clash = np.flatnonzero(labels == labels[literals ^ 1])
+    if len(clash):
+        raise UnsatisfiableError(int(clash[0]) >> 1)
+
+    # Classes come in opposite pairs; the one with the smaller root becomes
+    # the positive literal of a contracted vertex.
+    roots = np.flatnonzero(labels == literals)
+    positive = roots[roots < labels[roots ^ 1]]
+    class_literal = np.empty(literal_count, dtype=np.int32)
+    class_literal[positive] = 2 * np.arange(len(positive), dtype=np.int32)
+    class_literal[labels[positive ^ 1]] = class_literal[positive] + 1
+    contracted = class_literal[labels]
+    origin = np.empty(2 * len(positive), dtype=np.int32)
+    origin[contracted[::-1]] = literals[::-1]
+
+    reduced = ImplicationGraph.from_edges(2 * len(positive),
+                                          contracted[sources],
+                                          contracted[targets])
+    reduced_targets = np.frombuffer(reduced.targets, dtype=np.int32)
+    reduced_sources = np.repeat(
+        np.arange(reduced.literal_count, dtype=np.int32),
+        np.diff(np.frombuffer(reduced.offsets, dtype=np.int64)))
+    # A literal that implies its opposite is false.
+    forced = reduced_sources[reduced_targets == reduced_sources ^ 1] ^ 1
+    value = propagate_forced(reduced, forced.tolist(), origin)
+
+    free = np.frombuffer(value, dtype=np.int8) < 0
+    free_vertices = np.flatnonzero(free[0::2])
+    residual_literal = np.full(reduced.literal_count, -1, dtype=np.int32)
+    residual_literal[2 * free_vertices] = \
+        2 * np.arange(len(free_vertices), dtype=np.int32)
+    residual_literal[2 * free_vertices + 1] = \
+        residual_literal[2 * free_vertices] + 1
 
+    kept = free[reduced_sources] & free[reduced_targets]
+    residual = ImplicationGraph.from_edges(
+        2 * len(free_vertices), residual_literal[reduced_sources[kept]],
+        residual_literal[reduced_targets[kept]])
 
-def write_to_file(node_names: dict):
-    with open("output_file.txt", 'w', encoding='utf-8') as output:
-        for name, node in node_names.items():
-            output.write(f'{name} -> {node.node_color}\n')
+    literal_value = np.frombuffer(value, dtype=np.int8)[contracted]
+    literal_map = np.where(literal_value < 0, residual_literal[contracted],
+                           np.where(literal_value == 1, FORCED_TRUE,
+                                    FORCED_FALSE))
+    return Reduction(literal_map, residual, origin[2 * free_vertices] >> 1,
+                     literal_count - reduced.literal_count)
+
+
+def propagate_forced(graph: ImplicationGraph, forced: list,
+                     origin: np.ndarray) -> array:
+    # 1 for the forced literals and everything they imply, 0 for the
+    # opposites of those, -1 for the rest. origin names a literal of the
+    # original graph for every literal, to report a conflict with.
+    offsets = graph.offsets
+    targets = graph.targets
+    value = array('b', [-1]) * graph.literal_count
+    for literal in forced:
+        if value[literal] == 1:
+            continue
+        if value[literal] == 0:
+            raise UnsatisfiableError(int(origin[literal]) >> 1)
+        value[literal] = 1
+        value[literal ^ 1] = 0
+        stack: list = [literal]
+        while stack:
+            cur_node = stack.pop()
+            for idx in range(offsets[cur_node], offsets[cur_node + 1]):
+                next_node = targets[idx]
+                if value[next_node] == -1:
+                    value[next_node] = 1
+                    value[next_node ^ 1] = 0
+                    stack.append(next_node)
+                elif value[next_node] == 0:
+                    raise UnsatisfiableError(int(origin[next_node]) >> 1)
+    return value
+
+
+def explain_conflict(path: str, cycle: list, chunksize: int = None) -> str:
+    # Only runs on unsatisfiable inputs, so the edges are read again, the
+    # way main read them, rather than kept around for every solve.
+    node_names, node_colors, first, second = read_endpoints(path,
+                                                            chunksize)
+    names = restore_names(node_names)
+    first = np.asarray(first)
+    second = np.asarray(second)
+    vertex = cycle[0] >> 1
+    rows = conflict_rows(cycle, first, second)
+    binary = graph_format.is_binary(path)
+    if not binary:
+        line_of = csv_lines(path, rows)
+
+    def describe(literal: int) -> str:
+        color = POSSIBLE_COLORS[node_colors[literal >> 1]][literal & 1]
+        return f'{names[literal >> 1]} -> {COLORS[color]}'
+
+    lines = [f'{names[vertex]} can take neither of its two colors, '
+             f'{len(rows)} edges:']
+    for source, target, row in zip(cycle, cycle[1:], rows):
+        v, u = first[row], second[row]
+        where = f'{path} edge {row}' if binary else f'{path}:{line_of[row]}'
+        lines.append(f'  {describe(source)} => {describe(target)}    '
+                     f'{where}: {names[v]},{names[u]},'
+                     f'{COLORS[node_colors[v]]},{COLORS[node_colors[u]]}')
+    return '\n'.join(lines)
+
+
+def csv_lines(path: str, rows: list) -> dict:
+    # The line of the file every data row in rows starts on. Rows are
+    # counted the way pandas.read_csv counts them: blank and whitespace
+    # lines are skipped and the first other line is the header.
+    wanted = set(rows)
+    lines = {}
+    with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.reader(file)
+        row = -1
+        line = 1
+        for record in reader:
+            if len(record) > 1 or record and record[0].strip():
+                if row in wanted:
+                    lines[row] = line
+                    if len(lines) == len(wanted):
+                        break
+                row += 1
+            line = reader.line_num + 1
+    return lines
+
+
+def conflict_cycle(graph: ImplicationGraph, vertex: int) -> list:
+    # Shortest implication paths from a literal of the vertex to its
+    # opposite and back: x => ... => not x => ... => x.
+    literal = 2 * vertex
+    return shortest_path(graph, literal, literal ^ 1) + \
+        shortest_path(graph, literal ^ 1, literal)[1:]
+
+
+def shortest_path(graph: ImplicationGraph, start: int, goal: int) -> list:
+    offsets = graph.offsets
+    targets = graph.targets
+    parent = array('i', [NOT_VISITED]) * graph.literal_count
+    parent[start] = start
+    queue = deque([start])
+    while queue and parent[goal] == NOT_VISITED:
+        cur_node = queue.popleft()
+        for idx in range(offsets[cur_node], offsets[cur_node + 1]):
+            next_node = targets[idx]
+            if parent[next_node] == NOT_VISITED:
+                parent[next_node] = cur_node
+                queue.append(next_node)
+    if parent[goal] == NOT_VISITED:
+        raise ValueError(f'Literal {goal} is not reachable from {start}')
+
+    path = [goal]
+    while path[-1] != start:
+        path.append(parent[path[-1]])
+    return path[::-1]
+
+
+def conflict_rows(cycle: list, first: np.ndarray, second: np.ndarray) -> list:
+    # Every input edge between the same two vertices gives the same
+    # implications, so each step maps to the first such edge.
+    vertex_count = int(max(first.max(), second.max())) + 1
+    keys = np.minimum(first, second).astype(np.int64) * vertex_count + \
+        np.maximum(first, second)
+    steps = [min(a >> 1, b >> 1) * vertex_count + max(a >> 1, b >> 1)
+             for a, b in zip(cycle, cycle[1:])]
+    row_of = {}
+    for row in np.flatnonzero(np.isin(keys, steps)).tolist():
+        row_of.setdefault(int(keys[row]), row)
+    return [row_of[key] for key in steps]
+
+
+def write_to_file(node_names, new_colors: array,
+                  path: str = "output_file.txt", output_format: str = "text"):
+    # path may also be '-' for stdout or a file object.
+    result_format.write_result(path, node_names, new_colors, output_format)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recolor graph.csv into output_file.txt")
+    parser.add_argument('--input', default="graph.csv",
+                        help="graph in the CSV schema or the binary format")
+    parser.add_argument('--convert-to', metavar='PATH',
+                        help="only convert the CSV input to the binary "
+                             "format at PATH")
+    parser.add_argument('--solver', choices=SOLVERS, default="kosaraju",
+                        help="SCC algorithm: two-pass Kosaraju, "
+                             "single-pass Tarjan without the reverse graph, "
+                             "or forward-backward splitting on all cores")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="read graph.csv in chunks of this many rows "
+                             "and report the peak RSS")
+    parser.add_argument('--output', default="output_file.txt",
+                        help="where to write the new colors, '-' for stdout")
+    parser.add_argument('--format', choices=result_format.FORMATS,
+                        default="text",
+                        help="'vertex -> color' lines, CSV, JSON lines or "
+                             "int8 color codes in vertex order")
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="write stage timings and counters as JSON to "
+                             "PATH, '-' for stderr (or set "
+                             f"{instrumentation.ENV_METRICS})")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="run under cProfile and dump the stats to PATH "
+                             f"(or set {instrumentation.ENV_PROFILE})")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="report the tracemalloc peak and top "
+                             "allocation sites (or set "
+                             f"{instrumentation.ENV_TRACEMALLOC}=1)")
+    parser.add_argument('--preprocess', action='store_true',
+                        help="contract equivalent literals and fix forced "
+                             "ones before the SCC passes")
+    parser.add_argument('--cache', metavar='DIR',
+                        help="answer graphs solved before from a result "
+                             "cache in DIR, up to row order (or set "
+                             f"{result_cache.ENV_CACHE})")
+    args = parser.parse_args()
+    if args.convert_to:
+        convert_to_binary(args.input, args.convert_to,
+                          args.chunksize or 1_000_000)
+    else:
+        main(args.solver, args.chunksize, args.input,
+             instrumentation.Metrics.from_environment(
+                 args.metrics, args.profile, args.trace_memory),
+             args.output, args.format, args.preprocess,
+             result_cache.ResultCache.from_environment(args.cache))
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import tempfile
+from array import array
+from collections import OrderedDict
+
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+ENV_CACHE = "RECOLOR_CACHE"
+
+# Changes with the canonical form or the entry layout, so older entries
+# are never read back as current ones.
+KEY_VERSION = b'recolor-cache-1'
+
+# Entry layout, little-endian: magic, kind, count, then the int8 color
+# codes of the vertices in canonical order, or the int32 canonical
+# literals of the conflict cycle of an unsatisfiable graph.
+MAGIC = b'RCCACHE\x01'
+HEADER = struct.Struct('<8sbq')
+SATISFIABLE = 0
+UNSATISFIABLE = 1
+SUFFIX = '.result'
+
+MEMORY_BYTES = 256 << 20
+DISK_BYTES = 4 << 30
+# An eviction leaves the directory at this part of disk_bytes, so the
+# next scan only comes after that much more has been written.
+EVICT_FRACTION = 0.75
+
+
+class CachedResult:
+    # The new colors, or the conflict cycle, in canonical vertex order
+    # (see canonical_key).
+    colors: array = None
+    cycle: array = None
+
+    def __init__(self, colors: array = None, cycle: array = None):
+        self.colors = colors
+        self.cycle = cycle
+
+    def encode(self) -> bytes:
+        if self.cycle is not None:
+            return HEADER.pack(MAGIC, UNSATISFIABLE, len(self.cycle)) + \
+                self.cycle.tobytes()
+        return HEADER.pack(MAGIC, SATISFIABLE, len(self.colors)) + \
+            self.colors.tobytes()
+
+    @classmethod
+    def decode(cls, data: bytes) -> 'CachedResult':
+        if len(data) < HEADER.size:
+            raise ValueError('Truncated cache entry')
+        magic, kind, count = HEADER.unpack_from(data, 0)
+        values = array('i' if kind == UNSATISFIABLE else 'b',
+                       data[HEADER.size:])
+        if magic != MAGIC or len(values) != count:
+            raise ValueError('Corrupt cache entry')
+        if kind == UNSATISFIABLE:
+            return cls(cycle=values)
+        return cls(colors=values)
+
+
+class ResultCache:
+    # Results by the canonical key of their graph: a least recently used
+    # tier in memory over a directory of entry files, which is shared by
+    # every process pointed at it. The files that were used last are kept
+    # when the directory goes over disk_bytes. disk_size counts the bytes
+    # of the directory as of its last scan plus what was written since,
+    # so the directory is only scanned when that goes over.
+    directory: str
+    memory_bytes: int
+    disk_bytes: int
+    memory: OrderedDict
+    memory_size: int
+    disk_size: int = None
+
+    memory_hits: int
+    disk_hits: int
+    misses: int
+
+    def __init__(self, directory: str = None,
+                 memory_bytes: int = MEMORY_BYTES,
+                 disk_bytes: int = DISK_BYTES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_environment(cls, directory: str = None) -> 'ResultCache':
+        # None when caching is off.
+        directory = directory or os.environ.get(ENV_CACHE)
+        return cls(directory) if directory else None
+
+    def get(self, key: str) -> CachedResult:
+        # None on a miss.
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return CachedResult.decode(data)
+        data = self.read_entry(key)
+        if data is not None:
+            try:
+                result = CachedResult.decode(data)
+            except ValueError:
+                self.remove_entry(key)
+            else:
+                self.disk_hits += 1
+                self.remember(key, data)
+                return result
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: CachedResult):
+        data = result.encode()
+        self.remember(key, data)
+        if self.directory and len(data) <= self.disk_bytes:
+            if self.disk_size is None:
+                self.disk_size = self.evict_entries(self.disk_bytes)
+            self.disk_size += self.write_entry(key, data)
+            if self.disk_size > self.disk_bytes:
+                self.disk_size = self.evict_entries(
+                    int(self.disk_bytes * EVICT_FRACTION))
+
+    def counters(self) -> dict:
+        return {"cache_memory_hits": self.memory_hits,
+                "cache_disk_hits": self.disk_hits,
+                "cache_misses": self.misses}
+
+    def remember(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_size -= len(previous)
+        self.memory[key] = data
+        self.memory_size += len(data)
+        while self.memory_size > self.memory_bytes:
+            self.memory_size -= len(self.memory.popitem(last=False)[1])
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def read_entry(self, key: str):
+        if not self.directory:
+            return None
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            # The modification time orders the entries for eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def write_entry(self, key: str, data: bytes) -> int:
+        # Written under a temporary name and renamed, so a reader never
+        # sees half an entry. Returns the growth of the directory.
+        path = self.entry_path(key)
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = 0
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory,
+                                                 suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        return len(data) - replaced
+
+    def remove_entry(self, key: str):
+        try:
+            os.remove(self.entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict_entries(self, limit: int) -> int:
+        # Removes the least recently used entries until at most limit
+        # bytes are left, and returns the bytes left.
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+
+def canonical_key(node_names, node_colors: array, first, second):
+    # Hash of the vertex names, their colors and the set of edges, so row
+    # order, the order of the two ends of a row and repeated rows, which
+    # all give the same constraints, give the same key. Vertices are put
+    # in canonical order by name; returns the key and the canonical
+    # position of every vertex id. NumPy is only used for NumPy endpoints.
+    if hasattr(first, 'dtype'):
+        return canonical_key_vectorized(node_names, node_colors, first,
+                                        second)
+    names = list(node_names)
+    vertex_count = len(names)
+    if all(type(name) is int for name in names):
+        order = sorted(range(vertex_count), key=names.__getitem__)
+        names = array('q', [names[vertex] for vertex in order]).tobytes()
+    else:
+        texts = [str(name) for name in names]
+        order = sorted(range(vertex_count), key=texts.__getitem__)
+        names = join_names([texts[vertex] for vertex in order])
+    rank = array('i', bytes(4 * vertex_count))
+    for position, vertex in enumerate(order):
+        rank[vertex] = position
+
+    edges = set()
+    for a, b in zip(first, second):
+        a = rank[a]
+        b = rank[b]
+        edges.add(a * vertex_count + b if a < b else b * vertex_count + a)
+    colors = array('b', map(node_colors.__getitem__, order))
+    return digest(vertex_count, names, colors.tobytes(),
+                  array('q', sorted(edges)).tobytes()), rank
+
+
+def canonical_key_vectorized(node_names, node_colors: array,
+                             first: np.ndarray, second: np.ndarray):
+    if not hasattr(node_names, 'dtype'):
+        node_names = np.array(node_names, dtype=object)
+    vertex_count = len(node_names)
+    if node_names.dtype.kind in 'iu':
+        order = np.argsort(node_names, kind='stable')
+        names = node_names[order].astype(np.int64).tobytes()
+    else:
+        texts = node_names.astype(str)
+        order = np.argsort(texts, kind='stable')
+        names = join_names(texts[order].tolist())
+    rank = np.empty(vertex_count, dtype=np.int64)
+    rank[order] = np.arange(vertex_count)
+
+    a = rank[first]
+    b = rank[second]
+    edges = np.sort(np.minimum(a, b) * vertex_count + np.maximum(a, b))
+    edges = edges[np.diff(edges, prepend=-1) != 0]
+    colors = np.frombuffer(node_colors, dtype=np.int8)[order]
+    return digest(vertex_count, names, colors.tobytes(),
+                  edges.tobytes()), rank
+
+
+def join_names(texts: list) -> bytes:
+    # Text names are told from int64 ones by the leading zero byte.
+    return b'\0' + '\0'.join(texts).encode('utf-8', 'surrogatepass')
+
+
+def digest(vertex_count: int, names: bytes, colors: bytes,
+           edges: bytes) -> str:
+    key = hashlib.blake2b(KEY_VERSION, digest_size=20)
+    key.update(struct.pack('<qqq', vertex_count, len(names), len(edges) // 8))
+    key.update(names)
+    key.update(colors)
+    key.update(edges)
+    return key.hexdigest()
+
+
+def to_canonical(new_colors: array, rank) -> array:
+    # The color of every vertex id, in canonical order.
+    if hasattr(rank, 'dtype'):
+        colors = np.empty(len(rank), dtype=np.int8)
+        colors[rank] = np.frombuffer(new_colors, dtype=np.int8)
+        return array('b', colors.tobytes())
+    colors = array('b', bytes(len(rank)))
+    for vertex, position in enumerate(rank):
+        colors[position] = new_colors[vertex]
+    return colors
+
+
+def from_canonical(colors: array, rank) -> array:
+    if hasattr(rank, 'dtype'):
+        return array('b', np.frombuffer(colors, dtype=np.int8)[rank]
+                     .tobytes())
+    return array('b', map(colors.__getitem__, rank))
+
+
+def cycle_to_canonical(cycle: list, rank) -> array:
+    return array('i', [2 * int(rank[literal >> 1]) | literal & 1
+                       for literal in cycle])
+
+
+def cycle_from_canonical(cycle: array, rank) -> list:
+    wanted = {literal >> 1 for literal in cycle}
+    vertex_of = {position: vertex
+                 for vertex, position in enumerate(rank.tolist())
+                 if position in wanted}
+    return [2 * vertex_of[literal >> 1] | literal & 1 for literal in cycle]
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import struct
+import sys
+from array import array
+
+from lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+# Same order as program.COLORS, the codes are indices into it.
+COLORS = ["red", "green", "blue"]
+FORMATS = ("text", "csv", "jsonl", "binary")
+
+# Binary layout, little-endian: magic, vertex count, then the int8 color
+# code of every vertex id, in the order of the vertices of the input.
+MAGIC = b'RCCOLOR\x01'
+HEADER = struct.Struct('<8sq')
+
+# Vertices formatted per buffer before it is written out.
+BLOCK = 1 << 16
+
+
+def write_result(destination, node_names, new_colors,
+                 output_format: str = "text"):
+    # destination is a path, '-' for stdout, or a text or binary file
+    # object.
+    if output_format not in FORMATS:
+        raise ValueError(f'Unknown output format: {output_format}')
+    if isinstance(destination, str):
+        if destination == '-':
+            write_blocks(sys.stdout, node_names, new_colors, output_format)
+            sys.stdout.flush()
+            return
+        with open(destination, 'wb') as output:
+            write_blocks(output, node_names, new_colors, output_format)
+        return
+    write_blocks(destination, node_names, new_colors, output_format)
+
+
+def write_blocks(output, node_names, new_colors, output_format: str):
+    text_output = isinstance(output, io.TextIOBase)
+    if isinstance(new_colors, array) and new_colors.typecode == 'b':
+        colors = new_colors
+    else:
+        colors = np.asarray(new_colors, dtype=np.int8)
+    if output_format == "binary":
+        if text_output:
+            output.flush()
+            output = output.buffer
+        output.write(HEADER.pack(MAGIC, len(colors)))
+        output.write(colors.tobytes())
+        return
+
+    if text_output:
+        write = output.write
+    else:
+        def write(text: str):
+            output.write(text.encode('utf-8'))
+
+    format_block = {"text": text_block, "csv": csv_block,
+                    "jsonl": jsonl_block}[output_format]
+    if output_format == "csv":
+        write('vertex,color\n')
+    # Integer names need no quoting in CSV and JSON.
+    plain = hasattr(node_names, 'dtype') and node_names.dtype.kind in 'iu'
+    for start in range(0, len(colors), BLOCK):
+        names = names_slice(node_names, start)
+        write(format_block(names, colors[start:start + BLOCK].tolist(),
+                           plain or all(type(name) is int for name in names)))
+
+
+def names_slice(node_names, start: int) -> list:
+    names = node_names[start:start + BLOCK]
+    if hasattr(names, 'tolist'):
+        return names.tolist()
+    return list(names)
+
+
+def text_block(names: list, colors: list, plain: bool) -> str:
+    suffixes = [f' -> {color}\n' for color in COLORS]
+    return ''.join([f'{name}{suffixes[color]}'
+                    for name, color in zip(names, colors)])
+
+
+def csv_block(names: list, colors: list, plain: bool) -> str:
+    if plain:
+        suffixes = [f',{color}\n' for color in COLORS]
+        return ''.join([f'{name}{suffixes[color]}'
+                        for name, color in zip(names, colors)])
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(
+        zip(names, [COLORS[color] for color in colors]))
+    return buffer.getvalue()
+
+
+def jsonl_block(names: list, colors: list, plain: bool) -> str:
+    suffixes = [f', "color": "{color}"}}\n' for color in COLORS]
+    if not plain:
+        names = [json.dumps(name) for name in names]
+    return ''.join([f'{{"vertex": {name}{suffixes[color]}'
+                    for name, color in zip(names, colors)])
+
+
+def read_binary_colors(path: str) -> np.ndarray:
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a binary color file')
+    return np.frombuffer(data, np.int8, count, HEADER.size)
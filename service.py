@@ -0,0 +1,344 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+import graph_format
+import program
+import result_format
+
+MAX_BODY = 1 << 30
+# Every worker already runs one solve, so the parallel solver, which
+# starts a pool of its own per solve, would oversubscribe the machine.
+SOLVERS = ("kosaraju", "tarjan")
+# Workers are forked from a clean fork server where there is one, so a
+# pool replaced after the socket is bound does not hold the socket open.
+POOL_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+    else None)
+BINARY_TYPE = 'application/octet-stream'
+JSON_TYPE = 'application/json'
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HttpError(Exception):
+    status: int
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Response:
+    status: int
+    content_type: str
+    body: bytes
+    headers: dict
+
+    def __init__(self, status: int, content_type: str, body: bytes,
+                 headers: dict = None):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.headers = headers or {}
+
+    @classmethod
+    def json(cls, payload: dict, status: int = 200) -> 'Response':
+        return cls(status, JSON_TYPE, json.dumps(payload).encode('utf-8'))
+
+
+class SolverService:
+    # A resident solver behind a small HTTP/1.1 API on TCP or a Unix
+    # socket. The event loop only moves bytes; request bodies are parsed
+    # and solved in a pool of warm worker processes.
+    #   POST /solve  JSON {"rows": [[vertex1, vertex2, color1, color2]]}
+    #                or {"edges": [[vertex1, vertex2]], "colors": {...}},
+    #                or a binary graph file with Content-Type BINARY_TYPE.
+    #                ?solver=kosaraju|tarjan (see SOLVERS). A binary
+    #                answer (see result_format) is sent for Accept:
+    #                BINARY_TYPE.
+    #   GET /health  503 while the pool is broken or being replaced.
+    # A pool whose worker died (out of memory, a crash) is replaced by a
+    # new warm one; the requests it was running fail with 503.
+    solver: str
+    workers: int
+    pool: ProcessPoolExecutor
+    warming: asyncio.Future = None
+    solved: int
+    restarts: int
+
+    def __init__(self, workers: int = None, solver: str = "tarjan"):
+        self.solver = solver
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=POOL_CONTEXT)
+        self.solved = 0
+        self.restarts = 0
+
+    async def warm_up(self):
+        # Imports program (and pandas) in every worker before the first
+        # request comes.
+        pool = self.pool
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(pool, warm_worker)
+                                   for _ in range(self.workers)))
+        except BrokenProcessPool:
+            self.replace_pool(pool)
+
+    def replace_pool(self, broken: ProcessPoolExecutor):
+        # Once per broken pool, however many requests saw it break.
+        if self.pool is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=POOL_CONTEXT)
+        self.restarts += 1
+        self.warming = asyncio.ensure_future(self.warm_up())
+
+    def health(self) -> str:
+        # Submitting is the public way to ask a pool whether it broke.
+        try:
+            self.pool.submit(os.getpid)
+        except BrokenProcessPool:
+            self.replace_pool(self.pool)
+        if self.warming is not None and not self.warming.done():
+            return "restarting"
+        return "ok"
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080,
+                    unix_path: str = None):
+        await self.warm_up()
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_connection,
+                                                     unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host,
+                                                port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, target, headers, body = request
+                    response = await self.dispatch(method, target, headers,
+                                                   body)
+                except HttpError as error:
+                    headers = {'connection': 'close'}
+                    response = Response.json({"error": str(error)},
+                                             error.status)
+                except Exception as error:
+                    headers = {'connection': 'close'}
+                    response = Response.json(
+                        {"error": f'{type(error).__name__}: {error}'}, 500)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, target: str, headers: dict,
+                       body: bytes) -> Response:
+        url = urlsplit(target)
+        if url.path == '/health':
+            status = self.health()
+            return Response.json({"status": status, "workers": self.workers,
+                                  "solved": self.solved,
+                                  "restarts": self.restarts},
+                                 200 if status == "ok" else 503)
+        if url.path != '/solve':
+            raise HttpError(404, f'No such endpoint: {url.path}')
+        if method != 'POST':
+            raise HttpError(405, 'Use POST /solve')
+
+        solver = parse_qs(url.query).get('solver', [self.solver])[-1]
+        if solver not in SOLVERS:
+            raise HttpError(400, f'Unknown solver: {solver}')
+        binary = headers.get('content-type', '').startswith(BINARY_TYPE)
+        binary_answer = BINARY_TYPE in headers.get('accept', '')
+
+        start = time.perf_counter()
+        pool = self.pool
+        try:
+            answer, conflict, timings = \
+                await asyncio.get_running_loop().run_in_executor(
+                    pool, solve_request, body, binary, solver,
+                    binary_answer)
+        except ValueError as error:
+            raise HttpError(400, str(error))
+        except BrokenProcessPool:
+            self.replace_pool(pool)
+            raise HttpError(503, 'A solver worker died; the worker pool '
+                                 'is being replaced')
+        timings["total_seconds"] = time.perf_counter() - start
+        timings["queue_seconds"] = timings["total_seconds"] - \
+            timings["parse_seconds"] - timings["solve_seconds"]
+        self.solved += 1
+
+        if conflict is not None:
+            return Response.json({"satisfiable": False, "conflict": conflict,
+                                  "metrics": timings})
+        if binary_answer:
+            return Response(200, BINARY_TYPE, answer, {
+                f'X-{name.replace("_", "-").title()}': f'{value:.6f}'
+                for name, value in timings.items()})
+        # The colors were encoded by the worker.
+        return Response(200, JSON_TYPE, b'{"satisfiable": true, "metrics": ' +
+                        json.dumps(timings).encode('utf-8') +
+                        b', "colors": ' + answer + b'}')
+
+
+async def read_request(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split()
+    except ValueError:
+        raise HttpError(400, 'Malformed request line')
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HttpError(400, 'Bad Content-Length')
+    if length > MAX_BODY:
+        raise HttpError(413, f'Bodies are limited to {MAX_BODY} bytes')
+    body = await reader.readexactly(length) if length else b''
+    return method, target, headers, body
+
+
+async def write_response(writer: asyncio.StreamWriter, response: Response,
+                         keep_alive: bool):
+    head = [f'HTTP/1.1 {response.status} {REASONS[response.status]}',
+            f'Content-Type: {response.content_type}',
+            f'Content-Length: {len(response.body)}',
+            f'Connection: {"keep-alive" if keep_alive else "close"}']
+    head += [f'{name}: {value}' for name, value in response.headers.items()]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+    writer.write(response.body)
+    await writer.drain()
+
+
+def warm_worker():
+    # program imports numpy and pandas lazily; touching them here runs
+    # those imports now instead of in the worker's first request.
+    program.np.ndarray
+    program.pd.factorize
+    return os.getpid()
+
+
+def solve_request(body: bytes, binary: bool, solver: str,
+                  binary_answer: bool):
+    # Runs in a worker. Returns the encoded answer (a JSON object of
+    # colors by name, or the binary result), the name of the conflicting
+    # vertex and the timings.
+    start = time.perf_counter()
+    if binary:
+        node_names, colors, first, second = \
+            graph_format.read_graph_buffer(body, 'request body')
+        sources, targets = program.link_statements_vectorized(first, second,
+                                                              colors)
+        graph = program.ImplicationGraph.from_edges(2 * len(colors), sources,
+                                                    targets)
+        node_colors = program.to_array('b', colors)
+    else:
+        node_names, node_colors, graph = build_graph_from_json(body)
+    parsed = time.perf_counter()
+
+    timings = {"parse_seconds": parsed - start}
+    try:
+        new_colors = program.select_colors(
+            program.find_components(graph, solver), node_colors)
+    except program.UnsatisfiableError as error:
+        timings["solve_seconds"] = time.perf_counter() - parsed
+        return None, program.restore_names(node_names)[error.vertex], timings
+    timings["solve_seconds"] = time.perf_counter() - parsed
+
+    if binary_answer:
+        answer = result_format.HEADER.pack(result_format.MAGIC,
+                                           len(new_colors))
+        return answer + new_colors.tobytes(), None, timings
+    answer = json.dumps({name: program.COLORS[color] for name, color in
+                         zip(program.restore_names(node_names), new_colors)})
+    return answer.encode('utf-8'), None, timings
+
+
+def build_graph_from_json(body: bytes):
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as error:
+        raise ValueError(f'Bad JSON: {error}')
+    if not isinstance(payload, dict):
+        raise ValueError('Expected a JSON object')
+
+    if 'rows' in payload:
+        rows = payload['rows']
+        if not rows:
+            return program.build_graph([])
+        columns = np.array(rows, dtype=object)
+        if columns.ndim != 2 or columns.shape[1] != 4:
+            raise ValueError('rows must be [vertex1, vertex2, color1, '
+                             'color2] lists')
+        return program.build_graph_from_columns(*columns.T)
+    if 'edges' in payload and 'colors' in payload:
+        # JSON object keys are strings, so integer vertices are looked up
+        # by their text too.
+        colors = payload['colors']
+        try:
+            return program.build_graph_from_pairs(
+                payload['edges'], {name: colors[str(name)] for edge
+                                   in payload['edges'] for name in edge})
+        except KeyError as error:
+            raise ValueError(f'No color for vertex {error}')
+    raise ValueError('Expected "rows", or "edges" and "colors"')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve the solver over HTTP on TCP or a Unix socket")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int,
+                        default=int(os.environ.get('PORT', 8080)))
+    parser.add_argument('--unix', metavar='PATH', default=None,
+                        help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--solver', choices=SOLVERS, default="tarjan")
+    args = parser.parse_args()
+
+    service = SolverService(args.workers, args.solver)
+    # Stopped like Ctrl-C, so the workers are shut down with the service.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()